@@ -1,7 +1,9 @@
 import os
 import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from flask import Flask, request
+from flask import Flask, jsonify, request
 from twilio.twiml.messaging_response import MessagingResponse
 import openai
 from langchain_community.chat_models import ChatOpenAI  # Atualizado conforme aviso
@@ -15,6 +17,8 @@ from tools import (
     gerar_pdf,
     get_ultima_vaga_detalhada  # Importa a função correta
 )
+from shared_context import definir_usuario, esquecer_usuario
+from filas_usuario import FilaCheiaError, FilasPorUsuario
 
 # Variável global para armazenar o nome da última vaga detalhada
 # (Se você estiver armazenando o contexto em tools.py, essa variável não é necessária aqui)
@@ -41,7 +45,7 @@ def extrair_nome_vaga_dos_detalhes(mensagem: str) -> str:
         return match.group(1).strip()
     return None
 
-def get_last_assistant_message() -> str:
+def get_last_assistant_message(memory) -> str:
     """
     Retorna o conteúdo da última mensagem do assistente presente na memória.
     Se o atributo 'role' não estiver disponível, verifica o nome da classe.
@@ -77,32 +81,80 @@ system_message = (
     "Se o usuário pedir um relatório PDF, chame a função gerar_pdf."
 )
 
-# Inicializa a memória para manter o contexto da conversa
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-
-# Inicializa o agente com suporte a function calling e as ferramentas disponíveis
-agente_rh = initialize_agent(
-    tools=[
-        listar_vagas,
-        verificar_vagas_disponiveis,
-        detalhar_vaga,
-        mostrar_metricas,
-        gerar_pdf
-    ],
-    llm=llm,
-    agent=AgentType.OPENAI_MULTI_FUNCTIONS,
-    verbose=True,
-    memory=memory,
-    agent_kwargs={"system_message": system_message, "return_direct": True},
-)
+# Memória e agente por usuário (número do WhatsApp), para que uma conversa não
+# misture o histórico de outra; as menos recentes são descartadas acima do limite
+MAX_CONVERSAS = int(os.getenv("RH_MAX_CONVERSAS", "500"))
+conversas = OrderedDict()
+conversas_lock = threading.Lock()
+
+# Mensagens do mesmo número são processadas em ordem, uma por vez; números diferentes em paralelo
+# Limite por usuário abaixo do nº de threads do waitress (WAITRESS_THREADS, ver Procfile)
+THREADS_WAITRESS = int(os.getenv("WAITRESS_THREADS", "4"))
+filas = FilasPorUsuario(max_pendentes=int(os.getenv("FILA_MAX_POR_USUARIO", str(max(1, THREADS_WAITRESS // 2)))))
+
+def criar_agente(memory):
+    # Inicializa o agente com suporte a function calling e as ferramentas disponíveis
+    return initialize_agent(
+        tools=[
+            listar_vagas,
+            verificar_vagas_disponiveis,
+            detalhar_vaga,
+            mostrar_metricas,
+            gerar_pdf
+        ],
+        llm=llm,
+        agent=AgentType.OPENAI_MULTI_FUNCTIONS,
+        verbose=True,
+        memory=memory,
+        agent_kwargs={"system_message": system_message, "return_direct": True},
+    )
+
+def conversa_do_usuario(usuario: str):
+    """Retorna (memory, agente) da conversa do usuário, criando se ainda não existir."""
+    with conversas_lock:
+        if usuario in conversas:
+            conversas.move_to_end(usuario)
+            return conversas[usuario]
+    # Memória e agente são montados fora do lock, para não travar as conversas dos outros usuários
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    nova = (memory, criar_agente(memory))
+    with conversas_lock:
+        # Se outra thread criou a conversa nesse meio tempo, fica a dela
+        conversas.setdefault(usuario, nova)
+        conversas.move_to_end(usuario)
+        while len(conversas) > MAX_CONVERSAS:
+            antigo, _ = conversas.popitem(last=False)
+            esquecer_usuario(antigo)
+        return conversas[usuario]
 
 @app.route('/bot', methods=['POST'])
 def bot() -> str:
     """
     Endpoint que processa as mensagens recebidas via Twilio.
-    Utiliza o contexto para interpretar respostas positivas e negativas conforme o assunto.
+    Cada número tem a sua fila: as mensagens de um usuário são respondidas em
+    ordem, uma de cada vez, e usuários diferentes são atendidos em paralelo.
     """
     mensagem = request.form.get('Body', "").strip()
+    usuario = request.form.get('From') or "anonimo"
+
+    try:
+        with filas.de(usuario):
+            definir_usuario(usuario)
+            memory, agente_rh = conversa_do_usuario(usuario)
+            return responder(mensagem, memory, agente_rh)
+    except FilaCheiaError as e:
+        app.logger.warning(f"Fila do usuário cheia: {e}")
+        return enviar_resposta("Ainda estou respondendo suas mensagens anteriores. Aguarde um instante, por favor.")
+
+@app.route('/metricas/filas', methods=['GET'])
+def metricas_filas():
+    return jsonify(filas.estatisticas())
+
+def responder(mensagem: str, memory, agente_rh) -> str:
+    """
+    Processa a mensagem com a memória e o agente da conversa do usuário.
+    Utiliza o contexto para interpretar respostas positivas e negativas conforme o assunto.
+    """
     mensagem_lower = mensagem.lower()
 
     # Saudação simples
@@ -115,7 +167,7 @@ def bot() -> str:
 
     # Resposta positiva
     if mensagem_lower in positive_responses:
-        last_assistant_msg = get_last_assistant_message()
+        last_assistant_msg = get_last_assistant_message(memory)
         if last_assistant_msg:
             if "vagas" in last_assistant_msg or "oportunidades" in last_assistant_msg:
                 resposta_texto = listar_vagas("")
@@ -144,7 +196,7 @@ def bot() -> str:
     
     # Resposta negativa
     if mensagem_lower in negative_responses:
-        last_assistant_msg = get_last_assistant_message()
+        last_assistant_msg = get_last_assistant_message(memory)
         if last_assistant_msg:
             if "vagas" in last_assistant_msg or "oportunidades" in last_assistant_msg:
                 return enviar_resposta("Entendido. Se precisar de mais informações sobre vagas, estou à disposição.")
@@ -164,7 +216,7 @@ def bot() -> str:
     if "métricas" in mensagem_lower or "mais informações" in mensagem_lower:
         nome_extraido = extrair_nome_vaga(mensagem)
         if not nome_extraido:
-            last_assistant_msg = get_last_assistant_message()
+            last_assistant_msg = get_last_assistant_message(memory)
             nome_extraido = extrair_nome_vaga_dos_detalhes(last_assistant_msg)
         if nome_extraido:
             resposta_texto = agente_rh.run(f"mostrar_metricas {nome_extraido}")
@@ -180,7 +232,7 @@ def bot() -> str:
     if "pdf" in mensagem_lower:
         nome_extraido = extrair_nome_vaga(mensagem)
         if not nome_extraido:
-            last_assistant_msg = get_last_assistant_message()
+            last_assistant_msg = get_last_assistant_message(memory)
             nome_extraido = extrair_nome_vaga_dos_detalhes(last_assistant_msg)
         if nome_extraido:
             resposta_texto = agente_rh.run(f"gerar_pdf {nome_extraido}")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fila de execução por conversa para o webhook do bot.
+
+O waitress atende as requisições num pool de threads. Duas mensagens seguidas
+do mesmo número podem chegar a threads diferentes e disputar o mesmo contexto
+(a segunda lê o contexto antes de a primeira gravá-lo). Um lock global
+resolveria, mas serializaria todos os usuários.
+
+Aqui cada número (campo From) tem a sua fila, com senhas em ordem de chegada:
+as mensagens de um mesmo usuário são processadas uma de cada vez, na ordem em
+que chegaram, e usuários diferentes seguem em paralelo. A fila de um usuário só
+existe enquanto há mensagens dele em andamento, então a tabela não cresce com o
+número de usuários.
+
+Como cada mensagem em espera ocupa uma thread do waitress, um usuário com
+`max_pendentes` mensagens em andamento (a que está sendo processada mais as que
+aguardam) recebe FilaCheiaError nas seguintes, em vez de prender o pool inteiro.
+Para isso `max_pendentes` precisa ser menor que o nº de threads do waitress
+(--threads no Procfile); os bots usam metade das threads por padrão.
+
+Vale para um processo. Com vários workers (gunicorn), as mensagens de um número
+só ficam em ordem se o balanceador mantiver o número no mesmo worker.
+
+O mesmo arquivo existe em Tema bot/ e Rh bot/: cada bot é implantado sozinho
+(Procfile e requirements próprios), então mantenha as duas cópias iguais.
+
+Uso:
+    with filas.de(from_number):
+        ...  # carregar contexto, processar, salvar
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class FilaCheiaError(Exception):
+    """Mensagens demais do mesmo usuário aguardando processamento."""
+
+
+class _Fila:
+    __slots__ = ("senhas", "atendendo", "cond")
+
+    def __init__(self, lock):
+        self.senhas = 0       # senhas já emitidas
+        self.atendendo = 0    # senha da vez
+        self.cond = threading.Condition(lock)
+
+
+class FilasPorUsuario:
+    def __init__(self, max_pendentes: int = 2):
+        self.max_pendentes = max_pendentes
+        self._lock = threading.Lock()
+        self._filas = {}
+        self.processadas = 0
+        self.recusadas = 0
+        self.maior_profundidade = 0
+        self._esperas = deque(maxlen=1000)
+
+    @contextmanager
+    def de(self, usuario: str):
+        """Executa o bloco na vez de `usuario` (FIFO por usuário)."""
+        inicio = time.perf_counter()
+        with self._lock:
+            fila = self._filas.get(usuario)
+            if fila is None:
+                fila = self._filas[usuario] = _Fila(self._lock)
+            profundidade = fila.senhas - fila.atendendo  # mensagens à frente desta
+            if self.max_pendentes and profundidade >= self.max_pendentes:
+                self.recusadas += 1
+                raise FilaCheiaError(f"{profundidade} mensagens de {usuario} em andamento")
+            senha = fila.senhas
+            fila.senhas += 1
+            self.maior_profundidade = max(self.maior_profundidade, profundidade + 1)
+            while fila.atendendo != senha:
+                fila.cond.wait()
+            self._esperas.append(time.perf_counter() - inicio)
+        try:
+            yield
+        finally:
+            with self._lock:
+                fila.atendendo += 1
+                self.processadas += 1
+                if fila.atendendo == fila.senhas:
+                    del self._filas[usuario]  # ninguém mais esperando
+                else:
+                    fila.cond.notify_all()
+
+    def estatisticas(self) -> dict:
+        """Filas ativas, mensagens em andamento/espera e tempo de espera p50/p95 (segundos)."""
+        with self._lock:
+            profundidades = [f.senhas - f.atendendo for f in self._filas.values()]
+            esperas = sorted(self._esperas)
+            return {
+                "filas_ativas": len(profundidades),
+                "mensagens_em_andamento": sum(profundidades),
+                "aguardando": sum(p - 1 for p in profundidades),
+                "maior_fila_atual": max(profundidades, default=0),
+                "maior_fila": self.maior_profundidade,
+                "processadas": self.processadas,
+                "recusadas": self.recusadas,
+                "espera_p50": esperas[len(esperas) // 2] if esperas else None,
+                "espera_p95": esperas[min(len(esperas) - 1, int(len(esperas) * 0.95))] if esperas else None,
+            }
@@ -1,10 +1,22 @@
 # shared_context.py
+#
+# Contexto compartilhado entre o bot e as tools, separado por usuário: o bot.py
+# define o usuário da requisição (definir_usuario) antes de chamar o agente, e as
+# tools leem/gravam a última vaga detalhada daquele usuário.
 
-_ultima_vaga_detalhada = None
+from contextvars import ContextVar
+
+_usuario = ContextVar("usuario", default=None)
+_ultima_vaga_detalhada = {}
+
+def definir_usuario(usuario: str):
+    return _usuario.set(usuario)
+
+def esquecer_usuario(usuario: str):
+    _ultima_vaga_detalhada.pop(usuario, None)
 
 def set_ultima_vaga_detalhada(nome_vaga: str):
-    global _ultima_vaga_detalhada
-    _ultima_vaga_detalhada = nome_vaga
+    _ultima_vaga_detalhada[_usuario.get()] = nome_vaga
 
 def get_ultima_vaga_detalhada() -> str:
-    return _ultima_vaga_detalhada
+    return _ultima_vaga_detalhada.get(_usuario.get())
@@ -1,8 +1,13 @@
 import os
 from dotenv import load_dotenv
-from flask import Flask, request
+from flask import Flask, jsonify, request
 from twilio.twiml.messaging_response import MessagingResponse
 from tools import processar_mensagem, ChatContext  # Importa ChatContext também
+from session_store import criar_session_store
+from exceptions import SessaoConcorrenteError
+from filas_usuario import FilaCheiaError, FilasPorUsuario
+from rag_teste import estatisticas_especulacao
+import intencao_local
 
 # Carrega .env e API key
 load_dotenv()
@@ -12,15 +17,47 @@ if not OPENAI_API_KEY:
 
 app = Flask(__name__)
 
-# Dicionário para armazenar o contexto de chat por usuário (número de telefone)
-# Em produção, isso seria um banco de dados (Redis, Firestore, etc.)
-user_contexts = {}
+# Contexto de chat por usuário (número de telefone), com limite de tamanho e TTL.
+# O backend padrão (SQLite) é compartilhado entre os workers e sobrevive a restarts.
+# Com vários workers, mantenha cada número no mesmo worker (ver session_store.py).
+sessoes = criar_session_store()
+
+# Mensagens do mesmo número são processadas em ordem, uma por vez; números diferentes em paralelo
+# Limite por usuário abaixo do nº de threads do waitress (WAITRESS_THREADS, ver Procfile)
+THREADS_WAITRESS = int(os.getenv("WAITRESS_THREADS", "4"))
+filas = FilasPorUsuario(max_pendentes=int(os.getenv("FILA_MAX_POR_USUARIO", str(max(1, THREADS_WAITRESS // 2)))))
 
 def enviar_resposta(texto: str) -> str:
     resp = MessagingResponse()
     resp.message(texto)
     return str(resp)
 
+def responder(user_msg: str, from_number: str) -> str:
+    """Carrega o contexto do usuário, processa a mensagem e grava o contexto (na vez do usuário)."""
+    # Tenta obter o contexto para este usuário, ou cria um novo se não existir (ou expirou)
+    current_context, versao = sessoes.carregar(from_number)
+    if current_context is None:
+        current_context = ChatContext()
+        app.logger.info(f"Novo contexto criado para o usuário: {from_number}")
+
+    try:
+        # Chama sua lógica de processamento, passando o contexto atual
+        resposta = processar_mensagem(user_msg, current_context)
+    except Exception as e:
+        app.logger.error(f"Erro ao processar mensagem do usuário {from_number}: {e}", exc_info=True)
+        resposta = "Desculpe, ocorreu um problema ao processar sua solicitação."
+
+    # Grava o contexto atualizado (inclusive após erro, para não perder o histórico anterior)
+    try:
+        sessoes.salvar(from_number, current_context, versao)
+    except SessaoConcorrenteError as e:
+        # Outro worker atendeu este número no meio: a versão dele fica, a desta mensagem é descartada
+        app.logger.warning(f"Contexto do usuário {from_number} não foi salvo: {e}")
+    except Exception as e:
+        app.logger.error(f"Erro ao salvar o contexto do usuário {from_number}: {e}", exc_info=True)
+
+    return resposta
+
 @app.route("/bot", methods=["POST"])
 def bot():
     user_msg = request.form.get("Body", "").strip()
@@ -33,22 +70,31 @@ def bot():
         app.logger.warning("Requisição POST sem 'From' number. Não será possível manter o contexto.")
         return enviar_resposta("Desculpe, não consegui identificar seu número para continuar a conversa.")
 
-    # Tenta obter o contexto para este usuário, ou cria um novo se não existir
-    if from_number not in user_contexts:
-        user_contexts[from_number] = ChatContext()
-        app.logger.info(f"Novo contexto criado para o usuário: {from_number}")
-
-    current_context = user_contexts[from_number]
-
     try:
-        # Chama sua lógica de processamento, passando o contexto atual
-        resposta = processar_mensagem(user_msg, current_context)
-    except Exception as e:
-        app.logger.error(f"Erro ao processar mensagem do usuário {from_number}: {e}", exc_info=True)
-        resposta = "Desculpe, ocorreu um problema ao processar sua solicitação."
+        with filas.de(from_number):
+            resposta = responder(user_msg, from_number)
+    except FilaCheiaError as e:
+        app.logger.warning(f"Fila do usuário cheia: {e}")
+        resposta = "Ainda estou respondendo suas mensagens anteriores. Aguarde um instante, por favor."
 
     return enviar_resposta(resposta)
 
+@app.route("/metricas/sessoes", methods=["GET"])
+def metricas_sessoes():
+    return jsonify(sessoes.estatisticas())
+
+@app.route("/metricas/filas", methods=["GET"])
+def metricas_filas():
+    return jsonify(filas.estatisticas())
+
+@app.route("/metricas/intencao", methods=["GET"])
+def metricas_intencao():
+    return jsonify(intencao_local.estatisticas())
+
+@app.route("/metricas/especulacao", methods=["GET"])
+def metricas_especulacao():
+    return jsonify(estatisticas_especulacao())
+
 if __name__ == "__main__":
     # roda no host 0.0.0.0 se for em container, ou apenas debug local
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Calibra o limiar de distância usado pelo rag_answer para descartar perguntas
+fora do escopo antes de chamar o LLM.
+
+Entrada: um JSONL com perguntas rotuladas, uma por linha:
+    {"pergunta": "Como cadastrar um colaborador pelo app?", "relevante": true}
+    {"pergunta": "Qual a previsão do tempo amanhã?", "relevante": false}
+
+Para cada pergunta mede a distância do vizinho mais próximo no índice atual e
+escolhe o maior bloqueio de perguntas fora do escopo que ainda mantém pelo
+menos `--min-recall` das perguntas relevantes passando pelo filtro.
+O resultado é gravado em relevancia.json, ao lado do índice. Se a base usa
+bundles, a versão em uso é republicada com o novo limiar e os bots o pegam
+na próxima troca a quente.
+
+Uso:
+    python calibrar_limiar.py perguntas_rotuladas.jsonl --min-recall 0.98
+"""
+
+import argparse
+import json
+
+from rag_teste import embed_query, retriever
+from tema_bot.base_de_dados_vetorial.bundles import pasta_da_versao, publicar, versao_atual
+
+
+def distancias(perguntas) -> list:
+    resultado = []
+    base = retriever.snapshot()
+    for item in perguntas:
+        qvec = embed_query(item["pergunta"], base.modelo, base.dimensoes).reshape(1, -1)
+        D, _, _ = retriever.search(qvec, 1, base=base)
+        resultado.append((float(D[0][0]), bool(item["relevante"])))
+    return resultado
+
+
+def escolher_limiar(pontos, min_recall: float):
+    """
+    Testa como limiar cada ponto médio entre distâncias consecutivas.
+    Retorna (limiar, recall das relevantes, bloqueio das irrelevantes) ou None.
+    """
+    relevantes = sum(1 for _, r in pontos if r)
+    irrelevantes = len(pontos) - relevantes
+    ordenadas = sorted(d for d, _ in pontos)
+    candidatos = [(a + b) / 2 for a, b in zip(ordenadas, ordenadas[1:])] + [ordenadas[-1] + 1e-6]
+
+    melhor = None
+    for limiar in candidatos:
+        passam = sum(1 for d, r in pontos if r and d <= limiar)
+        bloqueadas = sum(1 for d, r in pontos if not r and d > limiar)
+        recall = passam / relevantes if relevantes else 1.0
+        bloqueio = bloqueadas / irrelevantes if irrelevantes else 0.0
+        if recall >= min_recall and (melhor is None or (bloqueio, recall) > (melhor[2], melhor[1])):
+            melhor = (limiar, recall, bloqueio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra o limiar de relevância do RAG.")
+    parser.add_argument("arquivo", help="JSONL com {pergunta, relevante}")
+    parser.add_argument("--min-recall", type=float, default=0.98,
+                        help="fração mínima das perguntas relevantes que deve passar pelo filtro")
+    parser.add_argument("--dry-run", action="store_true", help="só mostra o resultado, sem gravar")
+    args = parser.parse_args()
+
+    with open(args.arquivo, "r", encoding="utf-8") as f:
+        perguntas = [json.loads(linha) for linha in f if linha.strip()]
+
+    pontos = distancias(perguntas)
+    for rotulo, flag in (("relevantes", True), ("fora do escopo", False)):
+        ds = sorted(d for d, r in pontos if r is flag)
+        if ds:
+            print(f"{rotulo:>15}: n={len(ds)}, min={ds[0]:.4f}, mediana={ds[len(ds) // 2]:.4f}, max={ds[-1]:.4f}")
+
+    escolhido = escolher_limiar(pontos, args.min_recall)
+    if escolhido is None:
+        print("Nenhum limiar atende ao recall mínimo pedido.")
+        return
+    limiar, recall, bloqueio = escolhido
+    print(f"\nLimiar escolhido: {limiar:.4f} (relevantes mantidas: {recall:.1%}, "
+          f"fora do escopo bloqueadas: {bloqueio:.1%})")
+
+    if not args.dry_run:
+        destino = retriever.relevancia_path
+        with open(destino, "w", encoding="utf-8") as f:
+            json.dump({
+                "limiar": limiar,
+                "recall_relevantes": recall,
+                "bloqueio_fora_escopo": bloqueio,
+                "n_perguntas": len(pontos),
+                "versao_indice": retriever.versao,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"✅ Gravado em {destino}")
+
+        atual = versao_atual(retriever.base_dir)
+        if atual is not None:
+            nova = publicar(pasta_da_versao(retriever.base_dir, atual), retriever.base_dir,
+                            substituir={"relevancia.json": destino})
+            print(f"✅ Bundle {nova} publicado com o novo limiar")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cascata de modelos para classificar a "acao" das mensagens que o classificador
+local (intencao_local.py) não resolveu.
+
+Um modelo menor e mais rápido responde primeiro, com o mesmo prompt do roteador
+mais um campo "confianca" (0 a 1) autodeclarado. A mensagem sobe para o próximo
+modelo da cascata (por padrão gpt-4-turbo) quando a resposta do nível anterior:
+  - não é um JSON válido ou não segue o esquema {acao, resposta, confianca};
+  - traz uma "acao" fora da lista de ações do roteador (se ela foi informada);
+  - vem com confianca abaixo do limiar;
+  - ou a chamada à API falhou.
+O último nível é aceito sem exigir confiança e sem conferir a lista de ações:
+vale a "acao" que o modelo devolver. Só se nem isso vier (JSON inválido ou erro
+da API) a mensagem cai na ação padrão, sem derrubar a conversa.
+
+As ações válidas pertencem ao roteador (o prompt de _get_system_prompt_for_gpt),
+não a este módulo: passe-as em classificar(..., acoes=...) ou em CASCATA_ACOES.
+Sem lista, qualquer "acao" não vazia é aceita.
+
+Configuração:
+    CASCATA_MODELOS      modelos em ordem, separados por vírgula (padrão gpt-4o-mini,gpt-4-turbo)
+    CASCATA_LIMIAR       confiança mínima para aceitar um nível intermediário (padrão 0.75)
+    CASCATA_ACOES        ações válidas do roteador, separadas por vírgula (padrão: sem lista)
+    CASCATA_ACAO_PADRAO  ação usada quando nem o último nível responde (padrão outro)
+
+estatisticas() traz, por nível, chamadas, aceites, motivos de escalonamento e
+latência p50/p95, além da taxa de escalonamento total, para ajustar o limiar.
+
+Com o classificador local na frente:
+    rotear(msg, ctx, lambda m, c: classificar(m, _get_system_prompt_for_gpt(c), acoes=acoes_do_roteador)[:2])
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from openai import OpenAI
+
+MODELOS = [m.strip() for m in os.getenv("CASCATA_MODELOS", "gpt-4o-mini,gpt-4-turbo").split(",") if m.strip()]
+LIMIAR = float(os.getenv("CASCATA_LIMIAR", "0.75"))
+
+ACOES = frozenset(a.strip() for a in os.getenv("CASCATA_ACOES", "").split(",") if a.strip()) or None
+ACAO_PADRAO = os.getenv("CASCATA_ACAO_PADRAO", "outro")
+
+INSTRUCAO_CONFIANCA = (
+    '\nInclua também no JSON o campo "confianca": um número de 0 a 1 indicando o quanto '
+    'você tem certeza da "acao" escolhida. Use valores baixos quando a mensagem for ambígua.'
+)
+
+_client = None
+_lock = threading.Lock()
+_niveis = {}
+
+
+def _cliente() -> OpenAI:
+    global _client
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("Variável de ambiente OPENAI_API_KEY não definida no .env")
+        _client = OpenAI(api_key=api_key)
+    return _client
+
+
+def _metricas(modelo: str) -> dict:
+    with _lock:
+        return _niveis.setdefault(modelo, {
+            "chamadas": 0, "aceitas": 0, "padrao": 0, "escalonadas": Counter(), "latencias": deque(maxlen=1000),
+        })
+
+
+def validar(conteudo: str, exigir_confianca: bool, acoes=None):
+    """
+    Confere o JSON do modelo contra o esquema (e `acoes`, se houver lista).
+    Retorna (dados, None) se válido, ou (None, motivo) com o motivo de escalonamento.
+    """
+    try:
+        dados = json.loads(conteudo)
+    except (TypeError, json.JSONDecodeError):
+        return None, "json_invalido"
+    if not isinstance(dados, dict) or not isinstance(dados.get("resposta", ""), str):
+        return None, "json_invalido"
+    acao = dados.get("acao")
+    if not isinstance(acao, str) or not acao:
+        return None, "json_invalido"
+    if acoes is not None and acao not in acoes:
+        return None, "acao_desconhecida"
+    if exigir_confianca:
+        confianca = dados.get("confianca")
+        if isinstance(confianca, bool) or not isinstance(confianca, (int, float)) or not 0 <= confianca <= 1:
+            return None, "json_invalido"
+        if confianca < LIMIAR:
+            return None, "confianca_baixa"
+    return dados, None
+
+
+def classificar(mensagem: str, system_prompt: str, modelos=None, acoes=ACOES):
+    """
+    Classifica a mensagem subindo a cascata conforme necessário.
+    Retorna (acao, resposta, modelo que respondeu); se nenhum nível produzir uma
+    "acao", retorna (ACAO_PADRAO, "", None).
+    """
+    modelos = modelos or MODELOS
+    motivo = None
+    for nivel, modelo in enumerate(modelos):
+        ultimo = nivel == len(modelos) - 1
+        prompt = system_prompt if ultimo else system_prompt + INSTRUCAO_CONFIANCA
+        metricas = _metricas(modelo)
+        inicio = time.perf_counter()
+        try:
+            resp = _cliente().chat.completions.create(
+                model=modelo,
+                messages=[{"role": "system", "content": prompt}, {"role": "user", "content": mensagem}],
+                temperature=0.1 if ultimo else 0,
+                response_format={"type": "json_object"},
+            )
+            conteudo = resp.choices[0].message.content
+        except Exception as e:
+            conteudo, motivo_api = None, "erro_api"
+            print(f"CASCATA: erro no modelo {modelo} ({e})" + ("" if ultimo else "; escalonando"))
+        else:
+            motivo_api = None
+        latencia = time.perf_counter() - inicio
+
+        if motivo_api:
+            dados, motivo = None, motivo_api
+        else:
+            # No último nível não há para onde subir: a lista de ações não é exigida
+            dados, motivo = validar(conteudo, exigir_confianca=not ultimo, acoes=None if ultimo else acoes)
+            if ultimo and dados is not None and acoes is not None and dados["acao"] not in acoes:
+                print(f"CASCATA: {modelo} respondeu a ação '{dados['acao']}', fora da lista; aceita mesmo assim")
+        with _lock:
+            metricas["chamadas"] += 1
+            metricas["latencias"].append(latencia)
+            if dados is not None:
+                metricas["aceitas"] += 1
+            elif not ultimo:
+                metricas["escalonadas"][motivo] += 1
+            else:
+                metricas["padrao"] += 1
+
+        if dados is not None:
+            if nivel:
+                print(f"CASCATA: '{dados['acao']}' resolvida por {modelo} após escalonamento")
+            return dados["acao"], dados.get("resposta", ""), modelo
+
+    print(f"CASCATA: nenhum modelo respondeu no esquema ({motivo}); usando a ação padrão '{ACAO_PADRAO}'")
+    return ACAO_PADRAO, "", None
+
+
+def estatisticas() -> dict:
+    """Por nível: chamadas, aceites, motivos de escalonamento, quedas na ação padrão e latência p50/p95 (segundos)."""
+    with _lock:
+        resumo = {}
+        for modelo, m in _niveis.items():
+            ordenados = sorted(m["latencias"])
+            resumo[modelo] = {
+                "chamadas": m["chamadas"],
+                "aceitas": m["aceitas"],
+                "padrao": m["padrao"],
+                "escalonadas": dict(m["escalonadas"]),
+                "p50": ordenados[len(ordenados) // 2] if ordenados else None,
+                "p95": ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] if ordenados else None,
+            }
+        primeiro = _niveis.get(MODELOS[0]) if MODELOS else None
+        entradas = primeiro["chamadas"] if primeiro else 0
+        escalonadas = sum(primeiro["escalonadas"].values()) if primeiro else 0
+    return {
+        "niveis": resumo,
+        "taxa_escalonamento": escalonadas / entradas if entradas else 0.0,
+    }
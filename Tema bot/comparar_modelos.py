@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Comparação A/B entre a versão da base em uso e uma versão candidata (por
+exemplo, construída com outro modelo de embeddings via
+`basevetorial.py --candidato`), antes de colocá-la em uso.
+
+Para cada pergunta, cada versão é consultada com o seu próprio modelo e dimensão
+(do manifesto). São reportados:
+  - acerto@k: a URL esperada aparece entre os k primeiros
+  - concordância@k: fração dos k primeiros (por URL) em comum entre as versões
+  - latência p50/p99 da busca FAISS e tamanho do índice em disco
+
+Perguntas: um JSONL com {"pergunta": ..., "url": ...}; sem arquivo, usa os
+títulos dos artigos como perguntas e a própria URL como resposta esperada.
+
+Uso:
+    python comparar_modelos.py 20250101T120000-abcd1234
+    python comparar_modelos.py 20250101T120000-abcd1234 --perguntas avaliacao.jsonl -k 5
+    python comparar_modelos.py 20250101T120000-abcd1234 --ativar   # troca a versão em uso
+"""
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from rag_teste import embed_query, retriever
+from tema_bot.base_de_dados_vetorial.bundles import ativar, pasta_da_versao
+
+
+def perguntas_dos_titulos(metas, n: int, seed: int = 0) -> list:
+    vistos, perguntas = set(), []
+    for meta in metas:
+        if meta and meta["url"] not in vistos:
+            vistos.add(meta["url"])
+            perguntas.append({"pergunta": meta["title"], "url": meta["url"]})
+    random.Random(seed).shuffle(perguntas)
+    return perguntas[:n]
+
+
+def avaliar(base, perguntas, k: int):
+    """(urls dos k primeiros por pergunta, acertos, latências em ms)."""
+    resultados, acertos, latencias = [], 0, []
+    for item in perguntas:
+        qvec = embed_query(item["pergunta"], base.modelo, base.dimensoes).reshape(1, -1)
+        inicio = time.perf_counter()
+        _, I, metas = retriever.search(qvec, k * 3, base=base)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        # vários chunks do mesmo artigo contam uma vez só
+        urls = []
+        for idx in I[0]:
+            meta = metas[int(idx)] if idx >= 0 else None
+            if meta and meta["url"] not in urls:
+                urls.append(meta["url"])
+        urls = urls[:k]
+        resultados.append(urls)
+        acertos += item.get("url") in urls
+    return resultados, acertos, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a versão em uso da base com uma candidata.")
+    parser.add_argument("candidata", help="nome da versão candidata (pasta em bundles/)")
+    parser.add_argument("--perguntas", help="JSONL com {pergunta, url}")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("-n", type=int, default=200, help="nº de perguntas sintéticas (títulos)")
+    parser.add_argument("--ativar", action="store_true", help="coloca a candidata em uso ao final")
+    args = parser.parse_args()
+
+    atual = retriever.snapshot()
+    candidata = retriever.carregar_versao(args.candidata)
+    if args.perguntas:
+        with open(args.perguntas, "r", encoding="utf-8") as f:
+            perguntas = [json.loads(linha) for linha in f if linha.strip()]
+    else:
+        perguntas = perguntas_dos_titulos(atual.metas, args.n)
+    print(f"{len(perguntas)} perguntas, k={args.k}\n")
+
+    linhas = []
+    for rotulo, base in (("atual", atual), ("candidata", candidata)):
+        urls, acertos, latencias = avaliar(base, perguntas, args.k)
+        indice = pasta_da_versao(retriever.base_dir, base.versao) / retriever.index_name
+        tamanho = indice.stat().st_size / 2**20 if indice.exists() else float("nan")
+        linhas.append((rotulo, base, urls, acertos, latencias, tamanho))
+
+    print(f"{'versão':<12}{'modelo':<32}{'dim':>6}{'acerto@k':>10}{'p50 ms':>9}{'p99 ms':>9}{'MB':>8}")
+    for rotulo, base, _, acertos, latencias, tamanho in linhas:
+        modelo = base.modelo or "(sem manifesto)"
+        print(f"{rotulo:<12}{modelo:<32}{base.index.d:>6}{acertos / len(perguntas):>10.3f}"
+              f"{np.percentile(latencias, 50):>9.3f}{np.percentile(latencias, 99):>9.3f}{tamanho:>8.2f}")
+
+    comuns = [len(set(a) & set(b)) / args.k for a, b in zip(linhas[0][2], linhas[1][2])]
+    print(f"\nconcordância@k entre as versões: {np.mean(comuns):.3f}")
+
+    if args.ativar:
+        ativar(retriever.base_dir, args.candidata)
+        print(f"✅ {args.candidata} em uso; os bots trocam na próxima verificação do CURRENT")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de embeddings de consultas usado pelo rag_teste.py.
+
+Tem duas camadas:
+  1. LRU em memória (por processo), para as frases que se repetem o tempo todo;
+  2. SQLite em disco, compartilhado entre reinícios e entre workers do mesmo host.
+
+As chaves são a consulta normalizada (minúsculas, sem acentos e com espaços
+colapsados) + o nome do modelo, então "Esqueci a SENHA " e "esqueci a senha"
+reaproveitam o mesmo vetor.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def normalizar_consulta(texto: str) -> str:
+    """Normaliza a consulta para uso como chave (caixa, acentos e espaços)."""
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings em duas camadas (memória + SQLite).
+    Se `caminho` for None, só a camada em memória é usada.
+    """
+
+    def __init__(self, caminho=None, max_memoria: int = 1024, max_disco: int = 50000):
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_disco = 0
+
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.evictions_memoria = 0
+        self.evictions_disco = 0
+
+        if caminho:
+            caminho = Path(caminho)
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(caminho), check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " modelo TEXT NOT NULL,"
+                " chave TEXT NOT NULL,"
+                " vetor BLOB NOT NULL,"
+                " ultimo_acesso REAL NOT NULL,"
+                " PRIMARY KEY (modelo, chave))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_acesso ON embeddings (ultimo_acesso)"
+            )
+            self._conn.commit()
+            self._total_disco = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get(self, modelo: str, consulta: str):
+        """Retorna o vetor (float32) em cache ou None."""
+        chave = (modelo, normalizar_consulta(consulta))
+        with self._lock:
+            vetor = self._memoria.get(chave)
+            if vetor is not None:
+                self._memoria.move_to_end(chave)
+                self.hits_memoria += 1
+                return vetor
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT vetor FROM embeddings WHERE modelo = ? AND chave = ?", chave
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE embeddings SET ultimo_acesso = ? WHERE modelo = ? AND chave = ?",
+                        (time.time(), *chave),
+                    )
+                    self._conn.commit()
+                    vetor = np.frombuffer(row[0], dtype="float32")
+                    self._guardar_em_memoria(chave, vetor)
+                    self.hits_disco += 1
+                    return vetor
+
+            self.misses += 1
+            return None
+
+    def put(self, modelo: str, consulta: str, vetor) -> None:
+        """Armazena o vetor nas duas camadas."""
+        chave = (modelo, normalizar_consulta(consulta))
+        vetor = np.asarray(vetor, dtype="float32").ravel()
+        with self._lock:
+            self._guardar_em_memoria(chave, vetor)
+            if self._conn is None:
+                return
+            cur = self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (modelo, chave, vetor, ultimo_acesso) VALUES (?, ?, ?, ?)",
+                (*chave, vetor.tobytes(), time.time()),
+            )
+            if cur.rowcount:
+                self._total_disco += 1
+            if self._total_disco > self.max_disco:
+                self._evictar_disco()
+            self._conn.commit()
+
+    def _guardar_em_memoria(self, chave, vetor) -> None:
+        self._memoria[chave] = vetor
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+            self.evictions_memoria += 1
+
+    def _evictar_disco(self) -> None:
+        # Remove os menos acessados até voltar a ~90% do limite
+        # (evita um DELETE a cada novo insert).
+        self._total_disco = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excesso = self._total_disco - int(self.max_disco * 0.9)
+        if excesso <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            " SELECT rowid FROM embeddings ORDER BY ultimo_acesso LIMIT ?)",
+            (excesso,),
+        )
+        self._total_disco -= excesso
+        self.evictions_disco += excesso
+
+    def estatisticas(self) -> dict:
+        """Contadores de hit/miss e ocupação das duas camadas."""
+        total = self.hits_memoria + self.hits_disco + self.misses
+        return {
+            "hits_memoria": self.hits_memoria,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "taxa_acerto": (self.hits_memoria + self.hits_disco) / total if total else 0.0,
+            "itens_memoria": len(self._memoria),
+            "itens_disco": self._total_disco,
+            "evictions_memoria": self.evictions_memoria,
+            "evictions_disco": self.evictions_disco,
+        }
@@ -4,4 +4,12 @@ class RAGFallbackError(Exception):
     Exceção para acionar o fluxo de criação de ticket 
     quando o RAG não puder responder.
     """
-    pass
\ No newline at end of file
+    pass
+
+
+class SessaoConcorrenteError(Exception):
+    """
+    Exceção para quando a sessão foi gravada por outro worker entre o
+    carregar() e o salvar() (a versão lida não é mais a atual).
+    """
+    pass
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classificador local de intenção, consultado antes do roteador JSON do GPT.
+
+Boa parte das mensagens só precisa do rótulo "acao" e já vem num formato fixo,
+às vezes dependente do estado da conversa (flags do ChatContext). Regras:
+  - opcao_sac  awaiting_sac_option + a mensagem é um único dígito
+  - sim / nao  awaiting_confirmation + "sim"/"não" (e variações)
+  - cpf        a mensagem é só um CPF
+  - email      a mensagem é só um e-mail
+
+Regex resolve os formatos fixos e um léxico com rapidfuzz cobre erros de
+digitação nas respostas curtas ("simm", "nao", "isso mesmo"). Todo o resto
+continua indo para o modelo, assim como qualquer caso com confiança abaixo do
+limiar.
+
+O "acao" de cada regra tem de ser o rótulo que o roteador do GPT usaria para a
+mesma mensagem. Os padrões em ROTULOS são apenas nomes de partida: ajuste-os
+com INTENCAO_LOCAL_ROTULOS, um JSON {regra: acao}; uma regra com acao vazia
+fica desligada (a mensagem vai para o GPT).
+
+Quando o menu do SAC está aberto e a mensagem é texto livre, o desfecho provável
+é sac_duvida_avancada (que termina no rag_answer): deve_especular() sinaliza esse
+caso para que rag_teste.rotear_especulando() faça o embedding e a busca da
+pergunta em paralelo com a chamada ao GPT.
+
+Configuração:
+    INTENCAO_LOCAL         1 liga o classificador (padrão), 0 manda tudo ao GPT
+    INTENCAO_LOCAL_LIMIAR  confiança mínima para dispensar o GPT (padrão 0.85)
+    INTENCAO_LOCAL_ROTULOS JSON {regra: acao} que sobrepõe ROTULOS, ex.:
+                           '{"sim": "confirmar_cpf", "email": ""}'
+
+Medir a fração resolvida offline num log de mensagens (JSONL com
+{"mensagem": ..., "estado": "awaiting_sac_option" | ... | null}):
+    python intencao_local.py mensagens.jsonl
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from rapidfuzz import fuzz, process
+
+ATIVO = os.getenv("INTENCAO_LOCAL", "1") == "1"
+LIMIAR = float(os.getenv("INTENCAO_LOCAL_LIMIAR", "0.85"))
+MIN_PALAVRAS_ESPECULACAO = int(os.getenv("RAG_ESPECULACAO_MIN_PALAVRAS", "3"))
+MAX_PALAVRAS_LEXICO = 5  # respostas longas ("sim, mas o e-mail mudou") ficam com o GPT
+
+RE_CPF = re.compile(r"\d{3}\.?\d{3}\.?\d{3}-?\d{2}")
+RE_EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+RE_OPCAO_SAC = re.compile(r"\d")
+
+# regra -> "acao" devolvida (sobreposto por INTENCAO_LOCAL_ROTULOS)
+ROTULOS = {
+    "opcao_sac": "escolher_sac",
+    "sim": "confirmar",
+    "nao": "recusar",
+    "cpf": "informar_cpf",
+    "email": "informar_email",
+}
+ROTULOS.update(json.loads(os.getenv("INTENCAO_LOCAL_ROTULOS", "{}")))
+
+LEXICO_CONFIRMACAO = {
+    "sim": (
+        "sim", "s", "isso", "isso mesmo", "isso ai", "correto", "esta correto", "certo",
+        "exato", "confirmo", "pode ser", "positivo", "ok", "claro", "com certeza",
+    ),
+    "nao": (
+        "nao", "n", "negativo", "errado", "incorreto", "esta errado", "nao esta correto",
+        "nao e", "de jeito nenhum",
+    ),
+}
+_FRASES = [frase for frases in LEXICO_CONFIRMACAO.values() for frase in frases]
+_REGRA_DA_FRASE = {frase: regra for regra, frases in LEXICO_CONFIRMACAO.items() for frase in frases}
+
+
+@dataclass
+class Intencao:
+    acao: str
+    confianca: float
+    regra: str
+
+
+def _intencao(regra: str, confianca: float, detalhe: str = None) -> Optional[Intencao]:
+    acao = ROTULOS.get(regra)
+    return Intencao(acao, confianca, detalhe or regra) if acao else None
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", texto))
+
+
+def _confirmacao(texto: str) -> Optional[Intencao]:
+    normalizado = _normalizar(texto)
+    if not normalizado or len(normalizado.split()) > MAX_PALAVRAS_LEXICO:
+        return None
+    melhor = process.extractOne(normalizado, _FRASES, scorer=fuzz.ratio)
+    if melhor is None:
+        return None
+    frase, score, _ = melhor
+    regra = _REGRA_DA_FRASE[frase]
+    # "sim... não sei" e afins: se a melhor frase do rótulo oposto empata, é ambíguo
+    oposto = [f for f in _FRASES if _REGRA_DA_FRASE[f] != regra]
+    rival = process.extractOne(normalizado, oposto, scorer=fuzz.ratio)
+    if rival is not None and rival[1] >= score - 5:
+        return _intencao(regra, 0.5, f"{regra}_ambiguo")
+    return _intencao(regra, score / 100)
+
+
+def classificar(mensagem: str, contexto) -> Optional[Intencao]:
+    """
+    Rótulo de ação para a mensagem no estado atual, ou None se não há regra
+    aplicável. A confiança vem junto: abaixo do LIMIAR, quem chama deve usar o GPT.
+    """
+    texto = mensagem.strip()
+    if not texto:
+        return None
+
+    if getattr(contexto, "awaiting_sac_option", False) and RE_OPCAO_SAC.fullmatch(texto):
+        return _intencao("opcao_sac", 1.0)
+
+    if getattr(contexto, "awaiting_confirmation", False):
+        return _confirmacao(texto)
+
+    if RE_CPF.fullmatch(texto):
+        return _intencao("cpf", 1.0)
+    if RE_EMAIL.fullmatch(texto):
+        return _intencao("email", 1.0)
+    return None
+
+
+class _Contadores:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.locais = 0
+        self.por_acao = Counter()
+        self.tempo_local_us = 0.0
+        self.medidas = 0  # classificações cronometradas (as feitas dentro de rotear)
+
+    def registrar(self, intencao, local: bool, inicio: float = None) -> None:
+        with self._lock:
+            self.total += 1
+            if inicio is not None:
+                self.tempo_local_us += (time.perf_counter() - inicio) * 1e6
+                self.medidas += 1
+            if local:
+                self.locais += 1
+                self.por_acao[intencao.acao] += 1
+
+
+contadores = _Contadores()
+_NAO_CLASSIFICADA = object()
+
+
+def rotear(mensagem: str, contexto, via_llm, intencao=_NAO_CLASSIFICADA):
+    """
+    Ponto de entrada do roteamento: retorna (acao, resposta, origem).
+    Com o classificador confiante, resposta é None (o código monta o texto);
+    caso contrário `via_llm(mensagem, contexto)` é chamado e deve retornar
+    (acao, resposta), como o roteador JSON do GPT.
+    Quem já chamou classificar() passa o resultado em `intencao` (mesmo None).
+    """
+    inicio = None
+    if intencao is _NAO_CLASSIFICADA:
+        inicio = time.perf_counter()
+        intencao = classificar(mensagem, contexto) if ATIVO else None
+    local = intencao is not None and intencao.confianca >= LIMIAR
+    contadores.registrar(intencao, local, inicio)
+    if local:
+        return intencao.acao, None, "local"
+    acao, resposta = via_llm(mensagem, contexto)
+    return acao, resposta, "llm"
+
+
+def deve_especular(mensagem: str, contexto) -> bool:
+    """
+    True quando sac_duvida_avancada é o rótulo provável: menu do SAC aberto e a
+    mensagem é uma descrição em texto livre, não um número de opção.
+    """
+    if not getattr(contexto, "awaiting_sac_option", False):
+        return False
+    texto = mensagem.strip()
+    if RE_OPCAO_SAC.fullmatch(texto) or RE_EMAIL.fullmatch(texto) or RE_CPF.fullmatch(texto):
+        return False
+    return len(_normalizar(texto).split()) >= MIN_PALAVRAS_ESPECULACAO
+
+
+def estatisticas() -> dict:
+    """Mensagens roteadas, fração resolvida localmente, tempo médio de classificação e ações locais."""
+    with contadores._lock:
+        total = contadores.total
+        return {
+            "mensagens": total,
+            "locais": contadores.locais,
+            "via_llm": total - contadores.locais,
+            "fracao_local": contadores.locais / total if total else 0.0,
+            "classificacao_media_us": contadores.tempo_local_us / contadores.medidas if contadores.medidas else 0.0,
+            "por_acao": dict(contadores.por_acao),
+        }
+
+
+class _Estado:
+    def __init__(self, flag=None):
+        if flag:
+            setattr(self, flag, True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Uso: python intencao_local.py mensagens.jsonl")
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip():
+                item = json.loads(linha)
+                rotear(item["mensagem"], _Estado(item.get("estado")), lambda m, c: ("outro", None))
+    est = estatisticas()
+    print(f"{est['mensagens']} mensagens: {est['locais']} resolvidas localmente "
+          f"({est['fracao_local']:.1%}), {est['via_llm']} precisariam do GPT; "
+          f"{est['classificacao_media_us']:.1f} µs por mensagem")
+    for acao, n in sorted(est["por_acao"].items(), key=lambda x: -x[1]):
+        print(f"   {acao:<32}{n}")
@@ -2,15 +2,24 @@
 # -*- coding: utf-8 -*-
 
 import os
-import json
-import faiss
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI
 
 # Importa nosso "sinalizador" de falha
+import intencao_local
 from exceptions import RAGFallbackError
+from embedding_cache import EmbeddingCache
+from semantic_cache import SemanticCache
+from retriever import Retriever
+from tema_bot.base_de_dados_vetorial.chunker import estimar_tokens
+from tema_bot.base_de_dados_vetorial.embedding_config import chave_modelo, config_embedding, parametros_api
 
 # Carrega .env a partir da raiz do projeto
 load_dotenv() 
@@ -21,33 +30,303 @@ if not api_key:
     raise ValueError("Variável de ambiente OPENAI_API_KEY não definida no .env")
 client = OpenAI(api_key=api_key)
 
-# Carrega índice FAISS e metadados
-try:
-    # <<< CORREÇÃO AQUI >>>
-    # O caminho agora inclui a pasta 'tema_bot' para corresponder à sua estrutura de arquivos.
-    BASE = Path(__file__).parent / "tema_bot" / "base_de_dados_vetorial"
-    index = faiss.read_index(str(BASE / "articles_faiss.index"))
-    with open(BASE / "articles_metadata.json", "r", encoding="utf-8") as f:
-        metas = json.load(f)
-except FileNotFoundError:
-    # Levanta um erro claro se os arquivos da base não forem encontrados
-    raise FileNotFoundError(f"Erro ao carregar arquivos de base vetorial. Verifique se a estrutura de pastas está correta. Caminho verificado: {BASE}")
+# Modelo de embeddings para bases sem manifesto; com bundles vale o da versão em uso
+EMBEDDING = config_embedding()
+
+# Cache de embeddings das consultas (memória + SQLite em disco)
+embedding_cache = EmbeddingCache(
+    os.getenv("EMBEDDING_CACHE_PATH", Path(__file__).parent / ".cache" / "embeddings.sqlite3"),
+    max_memoria=int(os.getenv("EMBEDDING_CACHE_MEMORIA", "1024")),
+    max_disco=int(os.getenv("EMBEDDING_CACHE_DISCO", "50000")),
+)
+
+# Cache semântico de respostas (SQLite compartilhado entre workers)
+semantic_cache = SemanticCache(
+    os.getenv("SEMANTIC_CACHE_PATH", Path(__file__).parent / ".cache" / "respostas.sqlite3"),
+    limiar=float(os.getenv("SEMANTIC_CACHE_LIMIAR", "0.95")),
+    ttl=float(os.getenv("SEMANTIC_CACHE_TTL", str(6 * 3600))),
+)
+
+# Índice FAISS e metadados: carregados (via mmap) só na primeira busca
+BASE = Path(__file__).parent / "tema_bot" / "base_de_dados_vetorial"
+retriever = Retriever(BASE)
+
+# Orçamento de tokens para os trechos de contexto e nº de candidatos buscados
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1000"))
+CANDIDATOS = int(os.getenv("RAG_CANDIDATOS", "8"))
+
+# Busca híbrida: constante do Reciprocal Rank Fusion e critério do atalho só-lexical
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+BM25_FAST_CONFIANCA = float(os.getenv("BM25_FAST_CONFIANCA", "0.7"))
+BM25_FAST_MARGEM = float(os.getenv("BM25_FAST_MARGEM", "1.8"))
+
+# Limiar de distância do vizinho mais próximo (sobrepõe o relevancia.json da base)
+LIMIAR_DISTANCIA = float(os.getenv("RAG_LIMIAR_DISTANCIA", "0")) or None
+
+# Código de falha pedido ao modelo; o prefixo basta para abortar o streaming
+SENTINELA = "NAO_SEI_A_RESPOSTA"
+SENTINELA_PREFIXO = "NAO_SEI"
+
+# Recuperação especulativa (embedding + busca em paralelo com a classificação de intenção)
+_executor_especulacao = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RAG_ESPECULACAO_WORKERS", "4")), thread_name_prefix="rag-especulacao"
+)
+especulacao = Counter()
+_lock_especulacao = threading.Lock()
+
+# Latências das últimas chamadas ao LLM (segundos): tempo até o 1º token e total
+latencias_llm = {"ttft": deque(maxlen=1000), "total": deque(maxlen=1000)}
+
+
+def embed_query(query: str, modelo: str = None, dimensoes: int = None) -> np.ndarray:
+    """
+    Retorna o embedding da pergunta, consultando o cache antes da API.
+    Em caso de acerto nenhuma chamada de rede é feita. `modelo` / `dimensoes`
+    devem ser os da base consultada (padrão: EMBEDDING_MODEL / EMBEDDING_DIMENSIONS).
+    """
+    if modelo is None:
+        modelo, dimensoes = EMBEDDING["modelo"], EMBEDDING["dimensoes"]
+    chave = chave_modelo(modelo, dimensoes)
+    vetor = embedding_cache.get(chave, query)
+    if vetor is None:
+        resp = client.embeddings.create(model=modelo, input=query, **parametros_api(modelo, dimensoes))
+        vetor = np.array(resp.data[0].embedding, dtype="float32")
+        embedding_cache.put(chave, query, vetor)
+    return vetor
+
+
+def resumo_latencias() -> dict:
+    """p50/p95 do tempo até o primeiro token e do tempo total das chamadas ao LLM."""
+    resumo = {}
+    for nome, valores in latencias_llm.items():
+        if valores:
+            ordenados = sorted(valores)
+            resumo[nome] = {
+                "n": len(ordenados),
+                "p50": ordenados[len(ordenados) // 2],
+                "p95": ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))],
+            }
+    return resumo
+
+
+def gerar_resposta_streaming(prompt: str) -> str:
+    """
+    Chama o gpt-4-turbo em streaming e acumula a resposta. Se o início da resposta
+    for o código de falha, interrompe o stream na hora e lança RAGFallbackError.
+    """
+    inicio = time.perf_counter()
+    stream = client.chat.completions.create(
+        model="gpt-4-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.1,
+        stream=True,
+    )
+    partes = []
+    ttft = None
+    verificando = True  # só o início da resposta pode conter o código de falha
+    try:
+        for evento in stream:
+            if not evento.choices:
+                continue
+            delta = evento.choices[0].delta.content
+            if not delta:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - inicio
+                latencias_llm["ttft"].append(ttft)
+            partes.append(delta)
+
+            if not verificando:
+                continue
+            inicio_resposta = "".join(partes).lstrip(" \n'\"")
+            if len(inicio_resposta) < len(SENTINELA_PREFIXO):
+                continue
+            verificando = False
+            if inicio_resposta.startswith(SENTINELA_PREFIXO):
+                total = time.perf_counter() - inicio
+                latencias_llm["total"].append(total)
+                print(f"RAG: código de falha detectado no streaming após {total:.2f}s. Acionando fallback.")
+                raise RAGFallbackError("O modelo indicou não ter informações suficientes para responder.")
+    finally:
+        stream.close()
+
+    total = time.perf_counter() - inicio
+    latencias_llm["total"].append(total)
+    print(f"RAG: resposta gerada (1º token em {ttft or total:.2f}s, total {total:.2f}s)")
+    return "".join(partes).strip()
+
+
+def fundir_rrf(*rankings, k: int = RRF_K) -> list:
+    """Reciprocal Rank Fusion: combina listas de ids ordenadas por relevância."""
+    scores = {}
+    for ranking in rankings:
+        for pos, idx in enumerate(ranking):
+            idx = int(idx)
+            if idx >= 0:
+                scores[idx] = scores.get(idx, 0.0) + 1.0 / (k + pos + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def fora_de_escopo(D, limiar_base: float = None) -> bool:
+    """
+    True se até o vizinho mais próximo está longe demais: a pergunta não tem
+    relação com a base e não vale pagar a chamada ao LLM.
+    """
+    limiar = LIMIAR_DISTANCIA or limiar_base or retriever.limiar_distancia
+    return limiar is not None and float(D[0][0]) > limiar
+
+
+def lexical_confiante(resultados, score_maximo: float) -> bool:
+    """
+    O BM25 sozinho basta quando o melhor documento cobre boa parte dos termos
+    da pergunta (ponderados por idf) e fica bem à frente do segundo.
+    """
+    if not resultados or score_maximo <= 0:
+        return False
+    melhor = resultados[0][1]
+    segundo = resultados[1][1] if len(resultados) > 1 else 0.0
+    return melhor / score_maximo >= BM25_FAST_CONFIANCA and melhor >= BM25_FAST_MARGEM * segundo
+
+
+def montar_contexto(metas, ids, max_tokens: int = CONTEXT_TOKENS) -> list:
+    """
+    Empacota os trechos recuperados, em ordem de relevância, até o orçamento de tokens.
+    Registros de chunk entram inteiros; artigos inteiros (base antiga) são cortados em 500 caracteres.
+    """
+    contexts, usados, vistos = [], 0, set()
+    for idx in ids:
+        if idx < 0:
+            continue
+        meta = metas[int(idx)]
+        if meta is None or (meta["url"], meta.get("chunk")) in vistos:
+            continue
+        vistos.add((meta["url"], meta.get("chunk")))
+        if "chunk" in meta:
+            trecho = f"[{meta['title']}] {meta['content']}"
+        else:
+            trecho = f"[{meta['title']}] {meta['content'][:500]}..."
+        tokens = estimar_tokens(trecho)
+        if contexts and usados + tokens > max_tokens:
+            continue
+        contexts.append(trecho)
+        usados += tokens
+    return contexts
+
+
+def categoria_do_contexto(contexto) -> dict:
+    """
+    Filtro de categoria/seção a partir do estado da conversa. O ChatContext
+    pode guardar `categoria` e/ou `secao` (ids do help center) quando o assunto
+    já foi identificado; sem isso a busca é feita na base inteira.
+    """
+    if contexto is None:
+        return {}
+    filtro = {"categoria": getattr(contexto, "categoria", None), "secao": getattr(contexto, "secao", None)}
+    return {chave: valor for chave, valor in filtro.items() if valor}
+
+
+def filtro_da_busca(categoria: str = None, secao: str = None, contexto=None) -> dict:
+    """Filtro explícito (categoria / secao) ou, sem ele, o inferido do contexto."""
+    if categoria or secao:
+        return {chave: valor for chave, valor in (("categoria", categoria), ("secao", secao)) if valor}
+    return categoria_do_contexto(contexto)
 
 
-def rag_answer(query: str, k: int = 3) -> str:
+class Recuperacao:
+    """
+    Resultado da etapa de recuperação de uma pergunta: trechos de contexto, ou a
+    resposta do cache semântico, ou o motivo do fallback. Não grava nada no cache
+    semântico, então pode ser calculada especulativamente e descartada.
+    `busca` guarda os parâmetros com que foi feita (k, nprobe, ef_search, filtro).
+    """
+
+    def __init__(self, query: str, busca: tuple, versao: str, escopo: str, qvec=None, contexts=None,
+                 resposta_cache: str = None, fallback: str = None):
+        self.query = query
+        self.busca = busca
+        self.versao = versao
+        self.escopo = escopo          # parte da busca que separa as respostas no cache semântico
+        self.qvec = qvec
+        self.contexts = contexts
+        self.resposta_cache = resposta_cache
+        self.fallback = fallback      # motivo do RAGFallbackError, se houver
+        self.gravar_fallback = False  # fallback novo, que ainda deve ir para o cache
+
+
+def recuperar(query: str, k: int = 3, nprobe: int = None, ef_search: int = None,
+              categoria: str = None, secao: str = None, contexto=None) -> Recuperacao:
+    """Etapas 1-3 do rag_answer: busca lexical, embedding, cache semântico, busca vetorial e contexto."""
+    filtro = filtro_da_busca(categoria, secao, contexto)
+    busca = (k, nprobe, ef_search, filtro)
+    n_candidatos = max(k, CANDIDATOS)
+    # Um só snapshot da base para a pergunta inteira (a base pode ser trocada a quente)
+    base = retriever.snapshot()
+    versao = base.versao
+    # k não entra: o contexto do prompt é limitado por RAG_CONTEXT_TOKENS de qualquer forma
+    escopo = f"{filtro.get('categoria')}:{filtro.get('secao')}"
+
+    # 1. Busca lexical (BM25): se for conclusiva, nem chama a API de embeddings
+    lexicais, score_maximo, metas = retriever.search_lexical(query, n_candidatos, base=base, **filtro)
+    if lexical_confiante(lexicais, score_maximo):
+        print("RAG: BM25 conclusivo, pulando a busca vetorial.")
+        return Recuperacao(query, busca, versao, escopo, contexts=montar_contexto(metas, [idx for idx, _ in lexicais]))
+
+    # 1.1 Gera embedding da pergunta (ou reaproveita do cache)
+    qvec = embed_query(query, base.modelo, base.dimensoes).reshape(1, -1)
+    if qvec.shape[1] != base.index.d:
+        raise ValueError(
+            f"Embedding da pergunta tem dimensão {qvec.shape[1]}, mas a base {base.versao} tem {base.index.d}. "
+            "Confira EMBEDDING_MODEL / EMBEDDING_DIMENSIONS."
+        )
+
+    # 1.2 Pergunta quase idêntica já respondida com este índice?
+    cached = semantic_cache.buscar(qvec[0], versao, escopo)
+    if cached is not None:
+        resposta_cache, fallback_cache = cached
+        if fallback_cache:
+            return Recuperacao(query, busca, versao, escopo, qvec, fallback="O modelo indicou não ter informações suficientes para responder.")
+        return Recuperacao(query, busca, versao, escopo, qvec, resposta_cache=resposta_cache)
+
+    # 2. Busca vetorial e fusão com o ranking lexical (RRF)
+    D, I, metas = retriever.search(qvec, n_candidatos, nprobe=nprobe, ef_search=ef_search,
+                                   base=base, **filtro)
+
+    # 2.1 Nada próximo o bastante: fallback direto, sem chamar o LLM
+    if fora_de_escopo(D, base.limiar_distancia):
+        print(f"RAG: pergunta fora do escopo (distância {float(D[0][0]):.3f}). Acionando fallback.")
+        rec = Recuperacao(query, busca, versao, escopo, qvec, fallback="Nenhum trecho da base é próximo o bastante da pergunta.")
+        rec.gravar_fallback = True
+        return rec
+
+    # 3. Monta o contexto com os trechos recuperados, dentro do orçamento de tokens
+    ids = fundir_rrf(I[0], [idx for idx, _ in lexicais])
+    return Recuperacao(query, busca, versao, escopo, qvec, contexts=montar_contexto(metas, ids))
+
+
+def rag_answer(query: str, k: int = 3, nprobe: int = None, ef_search: int = None,
+               categoria: str = None, secao: str = None, contexto=None,
+               recuperacao: Recuperacao = None) -> str:
     """
     Busca a resposta usando RAG. 
     Se a resposta não for encontrada, lança a exceção RAGFallbackError.
+    `k` é o mínimo de trechos candidatos (o que entra no prompt é limitado por RAG_CONTEXT_TOKENS).
+    `nprobe` / `ef_search` ajustam a busca em índices IVF / HNSW.
+    `categoria` / `secao` restringem a busca a uma parte do help center; se não
+    vierem, são inferidas do `contexto` (ChatContext) quando houver.
+    `recuperacao` reaproveita uma recuperação já feita para esta pergunta com os
+    mesmos parâmetros de busca (ver rotear_especulando); senão as etapas 1-3 rodam aqui.
     """
-    # 1. Gera embedding da pergunta
-    resp = client.embeddings.create(model="text-embedding-ada-002", input=query)
-    qvec = np.array([resp.data[0].embedding], dtype="float32")
-    
-    # 2. Busca os k mais similares
-    D, I = index.search(qvec, k)
-    
-    # 3. Monta o contexto com os trechos recuperados
-    contexts = [f"[{metas[idx]['title']}] {metas[idx]['content'][:500]}..." for idx in I[0]]
+    busca = (k, nprobe, ef_search, filtro_da_busca(categoria, secao, contexto))
+    if recuperacao is None or (recuperacao.query, recuperacao.busca) != (query, busca):
+        recuperacao = recuperar(query, k, nprobe, ef_search, categoria, secao, contexto)
+    qvec, versao, escopo = recuperacao.qvec, recuperacao.versao, recuperacao.escopo
+
+    if recuperacao.fallback:
+        if recuperacao.gravar_fallback:
+            semantic_cache.guardar(query, qvec[0], versao, fallback=True, escopo=escopo)
+        raise RAGFallbackError(recuperacao.fallback)
+    if recuperacao.resposta_cache is not None:
+        return recuperacao.resposta_cache
 
     # 4. Monta o prompt para o LLM com a instrução de falha
     prompt = (
@@ -56,28 +335,111 @@ def rag_answer(query: str, k: int = 3) -> str:
         "Se a resposta não estiver clara ou não puder ser encontrada nos trechos, responda EXATAMENTE com a frase: "
         "'NAO_SEI_A_RESPOSTA'."
         "\n\nTRECHOS DE CONTEXTO:\n\n"
-        + "\n\n".join(contexts)
+        + "\n\n".join(recuperacao.contexts)
         + f"\n\nPERGUNTA DO USUÁRIO: {query}\n\nRESPOSTA:"
     )
     
-    # 5. Envia ao ChatGPT para gerar a resposta
-    chat_completion = client.chat.completions.create(
-        model="gpt-4-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1,
-    )
-    
-    response_text = chat_completion.choices[0].message.content.strip()
+    # 5. Envia ao ChatGPT em streaming; o código de falha no início aborta na hora
+    try:
+        response_text = gerar_resposta_streaming(prompt)
+    except RAGFallbackError:
+        if qvec is not None:
+            semantic_cache.guardar(query, qvec[0], versao, fallback=True, escopo=escopo)
+        raise
 
     # 6. <<< VERIFICAÇÃO E "AVISO" DE FALHA >>>
-    # Se a resposta do modelo for o nosso código de falha, disparamos o alarme.
-    if "NAO_SEI_A_RESPOSTA" in response_text:
+    # Se a resposta do modelo contiver o nosso código de falha, disparamos o alarme.
+    if SENTINELA in response_text:
         print("RAG falhou em encontrar uma resposta. Acionando fallback.")
+        if qvec is not None:
+            semantic_cache.guardar(query, qvec[0], versao, fallback=True, escopo=escopo)
         raise RAGFallbackError("O modelo indicou não ter informações suficientes para responder.")
 
-    # 7. Se tudo correu bem, retorna a resposta
+    # 7. Se tudo correu bem, guarda no cache e retorna a resposta
+    if qvec is not None:
+        semantic_cache.guardar(query, qvec[0], versao, resposta=response_text, escopo=escopo)
     return response_text
 
+
+def _contar_especulacao(evento: str) -> None:
+    with _lock_especulacao:
+        especulacao[evento] += 1
+
+
+def estatisticas_especulacao() -> dict:
+    """Recuperações especulativas iniciadas, aproveitadas, feitas em série, descartadas e com falha."""
+    with _lock_especulacao:
+        return dict(especulacao)
+
+
+class Especulacao:
+    """recuperar() submetida ao executor, com os argumentos para refazê-la em série."""
+
+    def __init__(self, query: str, kwargs: dict):
+        self.query = query
+        self.kwargs = kwargs
+        self.futuro = _executor_especulacao.submit(recuperar, query, **kwargs)
+
+
+def especular_recuperacao(query: str, **kwargs) -> Especulacao:
+    """
+    Inicia recuperar() em segundo plano enquanto a intenção ainda está sendo
+    classificada. Quem chama entrega o resultado com usar_especulacao() ou o
+    joga fora com descartar_especulacao().
+    """
+    _contar_especulacao("iniciadas")
+    return Especulacao(query, kwargs)
+
+
+def usar_especulacao(esp: Especulacao):
+    """
+    Recuperação especulada pronta para o rag_answer (None se ela falhou: refaz em série).
+    Se o executor ainda nem a começou (todos os workers ocupados), ela é
+    cancelada e feita aqui mesmo, em vez de esperar na fila.
+    """
+    if esp.futuro.cancel():
+        _contar_especulacao("em_serie")
+        return recuperar(esp.query, **esp.kwargs)
+    try:
+        recuperacao = esp.futuro.result()
+    except Exception as e:
+        print(f"RAG: recuperação especulativa falhou ({e}); refazendo.")
+        _contar_especulacao("falhas")
+        return None
+    _contar_especulacao("aproveitadas")
+    return recuperacao
+
+
+def descartar_especulacao(esp: Especulacao) -> None:
+    # Se já começou, termina em segundo plano: só o embedding (se não estava em cache) foi gasto
+    esp.futuro.cancel()
+    _contar_especulacao("descartadas")
+
+
+def rotear_especulando(mensagem: str, contexto, via_llm):
+    """
+    intencao_local.rotear() que, quando o rótulo provável é sac_duvida_avancada
+    (intencao_local.deve_especular), já faz a recuperação da pergunta em paralelo
+    com o GPT. Retorna (acao, resposta, origem, recuperacao): a recuperação só vem
+    se o rótulo final se confirmar (senão None); passe-a como rag_answer(..., recuperacao=...).
+    """
+    intencao = intencao_local.classificar(mensagem, contexto) if intencao_local.ATIVO else None
+    if (intencao is not None and intencao.confianca >= intencao_local.LIMIAR) \
+            or not intencao_local.deve_especular(mensagem, contexto):
+        return (*intencao_local.rotear(mensagem, contexto, via_llm, intencao=intencao), None)
+
+    esp = especular_recuperacao(mensagem, contexto=contexto)
+    try:
+        acao, resposta, origem = intencao_local.rotear(mensagem, contexto, via_llm, intencao=intencao)
+    except BaseException:
+        descartar_especulacao(esp)
+        raise
+    if acao != "sac_duvida_avancada":
+        descartar_especulacao(esp)
+        return acao, resposta, origem, None
+    return acao, resposta, origem, usar_especulacao(esp)
+
+
 if __name__ == "__main__":
     # Teste para o arquivo funcionando individualmente
     pergunta_teste = input("Teste RAG — digite uma pergunta:\n> ")
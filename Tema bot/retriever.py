@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Acesso preguiçoso à base vetorial (índice FAISS + metadados dos artigos).
+
+Os metadados vêm do articles_metadata.bin (ver metadata_store.py) quando ele
+existe; o articles_metadata.json continua aceito como alternativa. Se houver
+um articles_bm25.json ao lado do índice, ele é carregado para a busca lexical;
+o relevancia.json (gerado pelo calibrar_limiar.py) traz o limiar de distância
+usado para descartar perguntas fora do escopo da base.
+
+Nada é lido no import: o índice e os metadados só são abertos na primeira
+busca. O índice é aberto com as flags de mmap/somente-leitura do FAISS, então
+os workers do mesmo host compartilham as páginas do arquivo via page cache em
+vez de cada um manter sua cópia privada dos vetores.
+
+Com índices comprimidos (sq8, pq, ivfpq, flat16), FAISS_RERANK=N busca N*k
+candidatos e os re-pontua com os vetores float32 do articles_embeddings.npy,
+aberto em mmap: só as linhas dos candidatos são lidas do disco.
+
+Buscas podem ser restritas a uma categoria ou seção do help center: os ids
+de cada partição são calculados uma vez por snapshot a partir dos metadados e
+passados ao FAISS como IDSelectorBatch (e ao BM25 como conjunto permitido).
+
+Com bundles publicados (ver bundles.py), a base carregada é a versão apontada
+pelo CURRENT. A cada RAG_RELOAD_INTERVALO segundos a busca confere se o CURRENT
+mudou; se mudou, a nova versão é carregada numa thread à parte e entra no lugar
+da anterior com a troca de uma referência. Buscas em andamento terminam com o
+snapshot que já tinham, e nenhuma espera pela carga.
+
+Rodando este arquivo diretamente, ele mede o tempo de carga e o RSS do processo:
+    python retriever.py
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from tema_bot.base_de_dados_vetorial.bm25 import BM25Index
+from tema_bot.base_de_dados_vetorial.bundles import ler_manifesto, pasta_da_versao, verificar, versao_atual
+from tema_bot.base_de_dados_vetorial.index_factory import aceita_seletor, parametros_busca, reordenar_exato
+from tema_bot.base_de_dados_vetorial.metadata_store import MetadataStore
+
+BASE_DIR = Path(__file__).parent / "tema_bot" / "base_de_dados_vetorial"
+
+# IO_FLAG_MMAP_IFC (codes de IndexFlat em mmap) só existe em versões recentes do FAISS
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+
+
+class _Base:
+    """Índice, metadados, BM25 e versão carregados juntos (um snapshot da base)."""
+
+    def __init__(self, index, metas, versao: str, bm25=None, limiar_distancia=None, vetores=None,
+                 modelo: str = None, dimensoes: int = None):
+        self.index = index
+        # modelo de embeddings da base (do manifesto do bundle; None na base sem bundles)
+        self.modelo = modelo
+        self.dimensoes = dimensoes
+        self.vetores = vetores
+        self.metas = metas
+        self.versao = versao
+        self.bm25 = bm25
+        self.limiar_distancia = limiar_distancia
+        self._particoes = {}
+        self._lock = threading.Lock()
+
+    def particao(self, campo: str, valor):
+        """
+        (ids, IDSelectorBatch, set de ids) dos registros com metas[campo] == valor,
+        ou None se a partição estiver vazia. Calculado uma vez por snapshot.
+        """
+        chave = (campo, str(valor))
+        if chave not in self._particoes:
+            with self._lock:
+                if chave not in self._particoes:
+                    ids = np.array(
+                        [i for i, m in enumerate(self.metas) if m and str(m.get(campo) or "") == chave[1]],
+                        dtype="int64",
+                    )
+                    self._particoes[chave] = (
+                        (ids, faiss.IDSelectorBatch(ids), set(ids.tolist())) if len(ids) else None
+                    )
+        return self._particoes[chave]
+
+
+class Retriever:
+    """Carrega a base vetorial sob demanda e executa as buscas."""
+
+    def __init__(self, base_dir=BASE_DIR,
+                 index_name: str = "articles_faiss.index",
+                 metadata_name: str = "articles_metadata.bin",
+                 bm25_name: str = "articles_bm25.json",
+                 relevancia_name: str = "relevancia.json",
+                 embeddings_name: str = "articles_embeddings.npy",
+                 intervalo_reload: float = None):
+        self.base_dir = Path(base_dir)
+        self.index_name = index_name
+        self.metadata_name = metadata_name
+        self.bm25_name = bm25_name
+        self.relevancia_name = relevancia_name
+        self.embeddings_name = embeddings_name
+        # Onde o calibrar_limiar.py grava; bundles levam uma cópia
+        self.relevancia_path = self.base_dir / relevancia_name
+        if intervalo_reload is None:
+            intervalo_reload = float(os.getenv("RAG_RELOAD_INTERVALO", "30"))
+        self.intervalo_reload = intervalo_reload
+        self._base = None
+        self._lock = threading.Lock()
+        self._proxima_verificacao = 0.0
+        self._recarregando = False
+        self._rejeitada = None
+
+    def _obter_base(self) -> _Base:
+        base = self._base
+        if base is None:
+            with self._lock:
+                if self._base is None:
+                    pasta, versao = self._pasta_atual()
+                    self._base = self._carregar_bundle(versao) if versao else self._carregar(pasta)
+                    self._proxima_verificacao = time.monotonic() + self.intervalo_reload
+                base = self._base
+        elif self.intervalo_reload > 0 and time.monotonic() >= self._proxima_verificacao:
+            self._verificar_nova_versao(base)
+        return base
+
+    def _pasta_atual(self):
+        """(pasta, versão) do bundle do CURRENT, ou (base_dir, None) se não há bundles."""
+        versao = versao_atual(self.base_dir)
+        if versao is None:
+            return self.base_dir, None
+        return pasta_da_versao(self.base_dir, versao), versao
+
+    def _verificar_nova_versao(self, base: _Base) -> None:
+        with self._lock:
+            if self._recarregando or time.monotonic() < self._proxima_verificacao:
+                return
+            self._proxima_verificacao = time.monotonic() + self.intervalo_reload
+            versao = versao_atual(self.base_dir)
+            if versao is None or versao in (base.versao, self._rejeitada):
+                return
+            self._recarregando = True
+        threading.Thread(target=self._recarregar, args=(versao,), daemon=True).start()
+
+    def _recarregar(self, versao: str) -> None:
+        """Carrega a nova versão fora do caminho das buscas e troca o snapshot."""
+        try:
+            self._base = self._carregar_bundle(versao)
+            print(f"Base vetorial trocada para a versão {versao}")
+        except Exception as e:
+            print(f"⚠ Falha ao carregar o bundle {versao}: {e}; mantendo a versão {self._base.versao}")
+            self._rejeitada = versao
+        finally:
+            self._recarregando = False
+
+    def _carregar(self, pasta: Path, versao: str = None) -> _Base:
+        index_path = pasta / self.index_name
+        metadata_path = pasta / self.metadata_name
+        if not metadata_path.exists():
+            metadata_path = metadata_path.with_suffix(".json")
+        if not index_path.exists() or not metadata_path.exists():
+            raise FileNotFoundError(
+                "Erro ao carregar arquivos de base vetorial. Verifique se a estrutura de pastas "
+                f"está correta. Caminho verificado: {pasta}"
+            )
+        inicio = time.perf_counter()
+        try:
+            index = faiss.read_index(str(index_path), MMAP_FLAGS)
+        except RuntimeError:
+            # Tipos de índice sem suporte a mmap caem na leitura normal
+            index = faiss.read_index(str(index_path))
+        if metadata_path.suffix == ".json":
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metas = json.load(f)
+        else:
+            metas = MetadataStore(metadata_path)
+        bm25_path = pasta / self.bm25_name
+        bm25 = BM25Index.carregar(bm25_path) if bm25_path.exists() else None
+        # Bundles levam o próprio limiar: o da base_dir pode ser de outro modelo
+        relevancia_path = pasta / self.relevancia_name
+        limiar = None
+        if relevancia_path.exists():
+            with open(relevancia_path, "r", encoding="utf-8") as f:
+                limiar = json.load(f).get("limiar")
+        embeddings_path = pasta / self.embeddings_name
+        vetores = np.load(embeddings_path, mmap_mode="r") if embeddings_path.exists() else None
+        modelo = dimensoes = None
+        if (pasta / "manifest.json").exists():
+            manifesto = ler_manifesto(pasta)
+            modelo, dimensoes = manifesto.get("modelo"), manifesto.get("dimensoes")
+        if versao is None:
+            # Sem bundles: a versão é a assinatura do arquivo do índice
+            st = os.stat(index_path)
+            versao = f"{st.st_mtime_ns}-{st.st_size}"
+        print(f"Base vetorial carregada em {time.perf_counter() - inicio:.3f}s "
+              f"({index.ntotal} vetores, versão {versao})")
+        return _Base(index, metas, versao, bm25, limiar, vetores, modelo, dimensoes)
+
+    def _carregar_bundle(self, versao: str) -> _Base:
+        """Carrega um bundle publicado depois de conferir os sha256 do manifesto."""
+        pasta = pasta_da_versao(self.base_dir, versao)
+        if not verificar(pasta):
+            raise ValueError(f"bundle {versao} com checksum inválido (arquivo truncado ou alterado)")
+        return self._carregar(pasta, versao)
+
+    def carregar_versao(self, versao: str) -> _Base:
+        """Carrega uma versão publicada específica, sem trocar a que está em uso (comparações A/B)."""
+        return self._carregar_bundle(versao)
+
+    def snapshot(self) -> _Base:
+        """
+        A base em uso agora. Quem faz várias buscas para a mesma pergunta deve
+        usar um único snapshot, para não misturar versões no meio de uma troca.
+        """
+        return self._obter_base()
+
+    @property
+    def index(self):
+        return self._obter_base().index
+
+    @property
+    def metas(self):
+        return self._obter_base().metas
+
+    @property
+    def limiar_distancia(self):
+        """Distância L2 máxima do vizinho mais próximo para considerar a pergunta no escopo."""
+        return self._obter_base().limiar_distancia
+
+    @property
+    def versao(self) -> str:
+        """Versão do índice carregado (muda a cada rebuild)."""
+        return self._obter_base().versao
+
+    @staticmethod
+    def _filtro(base: _Base, categoria=None, secao=None):
+        """Partição pedida (a seção, mais específica, tem prioridade) ou None para buscar em tudo."""
+        if secao:
+            particao = base.particao("section", secao)
+        elif categoria:
+            particao = base.particao("category", categoria)
+        else:
+            return None
+        if particao is None:
+            # categoria inferida da conversa pode não existir nesta versão da base
+            print(f"Filtro categoria={categoria} secao={secao} sem registros; buscando na base inteira.")
+        return particao
+
+    def search(self, qvec, k: int, nprobe: int = None, ef_search: int = None, base: _Base = None,
+               rerank: int = None, categoria: str = None, secao: str = None):
+        """
+        Busca os k vizinhos mais próximos. Retorna (D, I, metas) do mesmo snapshot.
+        `nprobe` (IVF) e `ef_search` (HNSW) trocam recall por latência; o padrão vem
+        de FAISS_NPROBE / FAISS_EF_SEARCH. `rerank` (padrão FAISS_RERANK) busca
+        rerank*k candidatos e os reordena pela distância exata. `categoria` /
+        `secao` restringem a busca aos registros daquela parte do help center.
+        """
+        base = base or self._obter_base()
+        filtro = self._filtro(base, categoria, secao)
+        rerank = rerank if rerank is not None else int(os.getenv("FAISS_RERANK", "0"))
+        reordenar = rerank > 1 and base.vetores is not None
+        n = k * rerank if reordenar else k
+        if filtro is not None and not aceita_seletor(base.index):
+            # IndexPQ não aceita seletor: busca mais fundo e filtra depois
+            D, I = base.index.search(qvec, min(base.index.ntotal, n * 20))
+            D, I = _pos_filtrar(D, I, filtro[0], n)
+        else:
+            params = parametros_busca(
+                base.index,
+                nprobe=nprobe or int(os.getenv("FAISS_NPROBE", "0")),
+                ef_search=ef_search or int(os.getenv("FAISS_EF_SEARCH", "0")),
+                seletor=filtro[1] if filtro else None,
+            )
+            D, I = base.index.search(qvec, n, params=params)
+        if reordenar:
+            D, I = reordenar_exato(qvec, I, base.vetores, k)
+        return D, I, base.metas
+
+    def search_lexical(self, consulta: str, k: int, base: _Base = None,
+                       categoria: str = None, secao: str = None):
+        """
+        Busca BM25. Retorna (resultados [(id, score)], score máximo possível, metas),
+        ou ([], 0.0, metas) se a base não tiver índice lexical.
+        """
+        base = base or self._obter_base()
+        if base.bm25 is None:
+            return [], 0.0, base.metas
+        filtro = self._filtro(base, categoria, secao)
+        resultados = base.bm25.buscar(consulta, k, permitidos=filtro[2] if filtro else None)
+        return resultados, base.bm25.score_maximo(consulta), base.metas
+
+
+def _pos_filtrar(D, I, ids, n: int):
+    """Mantém, por linha, só os n primeiros resultados cujos ids estão em `ids`."""
+    D_out = np.full((len(I), n), np.inf, dtype="float32")
+    I_out = np.full((len(I), n), -1, dtype="int64")
+    for linha in range(len(I)):
+        manter = np.isin(I[linha], ids)
+        d, i = D[linha][manter][:n], I[linha][manter][:n]
+        D_out[linha, :len(d)] = d
+        I_out[linha, :len(i)] = i
+    return D_out, I_out
+
+
+def _memoria_mb() -> tuple:
+    """
+    (RSS total, RSS anônimo) do processo em MB. Páginas do índice em mmap
+    entram no RSS total mas não no anônimo, pois são compartilhadas entre workers.
+    """
+    valores = {}
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith(("VmRSS:", "RssAnon:")):
+                    chave, kb = linha.split()[:2]
+                    valores[chave] = int(kb) / 1024
+    except OSError:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return pico, pico
+    return valores.get("VmRSS:", 0.0), valores.get("RssAnon:", 0.0)
+
+
+if __name__ == "__main__":
+    rss_antes, anon_antes = _memoria_mb()
+    inicio = time.perf_counter()
+    r = Retriever()
+    print(f"Import/instância: {time.perf_counter() - inicio:.4f}s, RSS {rss_antes:.1f} MB")
+
+    inicio = time.perf_counter()
+    r.index
+    r.metas
+    rss, anon = _memoria_mb()
+    print(f"Primeira carga: {time.perf_counter() - inicio:.4f}s, "
+          f"RSS +{rss - rss_antes:.1f} MB (privado +{anon - anon_antes:.1f} MB)")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache semântico de respostas do RAG.
+
+Guarda (embedding da pergunta, resposta) num SQLite em modo WAL, que pode ser
+compartilhado por todos os workers do waitress/gunicorn no mesmo host. Uma nova
+pergunta reaproveita a resposta de outra já respondida quando a similaridade de
+cosseno entre os embeddings passa do limiar configurado e a entrada ainda está
+dentro do TTL.
+
+Cada entrada carrega a versão do índice FAISS em que foi gerada; quando o
+articles_faiss.index é reconstruído, a versão muda e as entradas antigas deixam
+de ser consideradas (e são apagadas na próxima limpeza).
+
+O escopo (por exemplo o filtro de categoria/seção da busca) separa respostas
+da mesma versão que não são intercambiáveis: a busca só considera entradas do
+mesmo escopo, mas escopos diferentes convivem no cache sem se apagarem.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+class SemanticCache:
+    """Cache de respostas indexado pela similaridade do embedding da pergunta."""
+
+    def __init__(self, caminho, limiar: float = 0.95, ttl: float = 6 * 3600, max_itens: int = 5000):
+        self.limiar = limiar
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._lock = threading.Lock()
+
+        # Espelho em memória das entradas válidas, sincronizado por id crescente
+        self._versao = None
+        self._ultimo_id = 0
+        self._ids = []
+        self._criado_em = []
+        self._escopos = []
+        self._respostas = []
+        self._fallbacks = []
+        # Vetores num buffer pré-alocado: as entradas válidas são as linhas
+        # [_inicio, _inicio + len(_ids)); expirar só avança _inicio e inserir só
+        # copia as linhas novas (o buffer é refeito, com o dobro do necessário, ao encher)
+        self._buffer = None
+        self._inicio = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(caminho), check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS respostas ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " versao_indice TEXT NOT NULL,"
+            " consulta TEXT NOT NULL,"
+            " escopo TEXT NOT NULL DEFAULT '',"
+            " vetor BLOB NOT NULL,"
+            " resposta TEXT,"
+            " fallback INTEGER NOT NULL,"
+            " criado_em REAL NOT NULL)"
+        )
+        colunas = {linha[1] for linha in self._conn.execute("PRAGMA table_info(respostas)")}
+        if "escopo" not in colunas:  # cache criado antes da coluna existir
+            self._conn.execute("ALTER TABLE respostas ADD COLUMN escopo TEXT NOT NULL DEFAULT ''")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_respostas_versao ON respostas (versao_indice, id)"
+        )
+        self._conn.commit()
+
+    def buscar(self, vetor, versao_indice: str, escopo: str = ""):
+        """
+        Procura uma resposta para uma pergunta parecida no mesmo escopo.
+        Retorna (resposta, fallback) ou None.
+        """
+        vetor = _normalizar(vetor)
+        with self._lock:
+            self._sincronizar(versao_indice)
+            if not self._ids:
+                self.misses += 1
+                return None
+
+            vetores = self._buffer[self._inicio:self._inicio + len(self._ids)]
+            sims = np.where(np.asarray(self._escopos) == escopo, vetores @ vetor, -np.inf)
+            pos = int(np.argmax(sims))
+            if sims[pos] < self.limiar:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return self._respostas[pos], self._fallbacks[pos]
+
+    def guardar(self, consulta: str, vetor, versao_indice: str, resposta=None, fallback: bool = False,
+                escopo: str = "") -> None:
+        """Registra a resposta (ou o fallback "NAO_SEI_A_RESPOSTA") para a pergunta."""
+        vetor = _normalizar(vetor)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO respostas (versao_indice, escopo, consulta, vetor, resposta, fallback, criado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (versao_indice, escopo, consulta, vetor.tobytes(), resposta, int(fallback), time.time()),
+            )
+            self._conn.commit()
+            # Traz a própria entrada (e as de outros workers) para o espelho
+            self._sincronizar(versao_indice)
+
+    def _sincronizar(self, versao_indice: str) -> None:
+        if versao_indice != self._versao:
+            # Índice reconstruído: descarta o espelho e apaga entradas de versões antigas
+            self._versao = versao_indice
+            self._ultimo_id = 0
+            self._ids, self._criado_em, self._escopos, self._respostas, self._fallbacks = [], [], [], [], []
+            self._buffer, self._inicio = None, 0
+            self._conn.execute("DELETE FROM respostas WHERE versao_indice != ?", (versao_indice,))
+            self._conn.commit()
+
+        limite = time.time() - self.ttl
+        rows = self._conn.execute(
+            "SELECT id, escopo, vetor, resposta, fallback, criado_em FROM respostas"
+            " WHERE versao_indice = ? AND id > ? AND criado_em >= ? ORDER BY id",
+            (versao_indice, self._ultimo_id, limite),
+        ).fetchall()
+
+        novos = []
+        for id_, escopo, blob, resposta, fallback, criado_em in rows:
+            self._ids.append(id_)
+            self._criado_em.append(criado_em)
+            self._escopos.append(escopo)
+            self._respostas.append(resposta)
+            self._fallbacks.append(bool(fallback))
+            novos.append(np.frombuffer(blob, dtype="float32"))
+            self._ultimo_id = id_
+        if novos:
+            self._anexar(np.vstack(novos))
+
+        self._expirar(limite)
+
+    def _anexar(self, novos: np.ndarray) -> None:
+        validos = len(self._ids) - len(novos)  # os ids novos já foram anexados
+        fim = self._inicio + validos
+        if self._buffer is None or fim + len(novos) > len(self._buffer):
+            necessario = validos + len(novos)
+            capacidade = len(self._buffer) if self._buffer is not None else 0
+            if necessario * 2 > capacidade:
+                capacidade = max(64, necessario * 2)
+            buffer = np.empty((capacidade, novos.shape[1]), dtype="float32")
+            if validos:
+                buffer[:validos] = self._buffer[self._inicio:fim]
+            self._buffer, self._inicio, fim = buffer, 0, validos
+        self._buffer[fim:fim + len(novos)] = novos
+
+    def _expirar(self, limite: float) -> None:
+        # As entradas estão em ordem de id (e portanto de criação)
+        corte = 0
+        while corte < len(self._criado_em) and self._criado_em[corte] < limite:
+            corte += 1
+        corte = max(corte, len(self._ids) - self.max_itens)
+        if corte <= 0:
+            return
+        ultimo_removido = self._ids[corte - 1]
+        del self._ids[:corte], self._criado_em[:corte], self._escopos[:corte]
+        del self._respostas[:corte], self._fallbacks[:corte]
+        if self._ids:
+            self._inicio += corte
+        else:
+            self._buffer, self._inicio = None, 0
+        self._conn.execute("DELETE FROM respostas WHERE id <= ?", (ultimo_removido,))
+        self._conn.commit()
+
+    def estatisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": self.hits / total if total else 0.0,
+            "itens": len(self._ids),
+            "versao_indice": self._versao,
+        }
+
+
+def _normalizar(vetor) -> np.ndarray:
+    vetor = np.asarray(vetor, dtype="float32").ravel()
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
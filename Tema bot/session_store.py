@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento das sessões (ChatContext) dos usuários do bot, por número do WhatsApp.
+
+Dois backends com a mesma interface (carregar / salvar / remover / estatisticas):
+  - SessionStoreMemoria: LRU + TTL no próprio processo. Limita a memória, mas cada
+    worker tem as suas sessões e elas somem no restart.
+  - SessionStoreSQLite: SQLite em modo WAL, compartilhado por todos os workers do
+    waitress/gunicorn no mesmo host e preservado entre reinícios.
+
+As sessões são serializadas com pickle (protocolo mais recente) e comprimidas
+com zlib. Sessões paradas há mais de `ttl` segundos expiram; acima de
+`max_sessoes`, as menos usadas são descartadas.
+
+Concorrência: carregar() retorna (contexto, versao) e salvar(..., versao) só
+grava se a sessão ainda estiver naquela versão (compare-and-swap); se outro
+worker gravou no meio, levanta SessaoConcorrenteError e nada é sobrescrito.
+Isso evita perder atualizações em silêncio, mas não ordena as mensagens: a
+fila por usuário (filas_usuario.py) vale só dentro de um processo, então com
+vários workers o balanceador deve manter cada número no mesmo worker
+(roteamento "sticky") para que conflitos sejam exceção.
+
+Segurança: desserializar executa pickle, que pode rodar código arbitrário.
+O arquivo do SQLite (SESSION_PATH) deve ficar num diretório que só o usuário
+do bot consegue escrever; nunca aponte para um arquivo compartilhado com
+outros serviços ou vindo de fora.
+
+Configuração (criar_session_store):
+    SESSION_STORE   memoria | sqlite (padrão sqlite)
+    SESSION_PATH    arquivo do SQLite (padrão .cache/sessoes.sqlite3)
+    SESSION_TTL     segundos sem mensagens até a sessão expirar (padrão 24h)
+    SESSION_MAX     nº máximo de sessões guardadas (padrão 10000)
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from exceptions import SessaoConcorrenteError
+
+
+def serializar(contexto) -> bytes:
+    return zlib.compress(pickle.dumps(contexto, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def desserializar(blob: bytes):
+    return pickle.loads(zlib.decompress(blob))
+
+
+class _Metricas:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expiradas = 0
+        self.evictions = 0
+        self.conflitos = 0
+        self._tempo_carga = 0.0
+        self._cargas = 0
+        self._maior_carga = 0.0
+
+    def registrar_carga(self, inicio: float) -> None:
+        ms = (time.perf_counter() - inicio) * 1000
+        self._tempo_carga += ms
+        self._cargas += 1
+        self._maior_carga = max(self._maior_carga, ms)
+
+    def resumo(self, sessoes: int) -> dict:
+        total = self.hits + self.misses
+        return {
+            "sessoes": sessoes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": self.hits / total if total else 0.0,
+            "expiradas": self.expiradas,
+            "evictions": self.evictions,
+            "conflitos": self.conflitos,
+            "carga_media_ms": self._tempo_carga / self._cargas if self._cargas else 0.0,
+            "carga_max_ms": self._maior_carga,
+        }
+
+
+class SessionStoreMemoria:
+    """Sessões em memória do processo, com limite de itens (LRU) e expiração (TTL)."""
+
+    def __init__(self, ttl: float = 24 * 3600, max_sessoes: int = 10000):
+        self.ttl = ttl
+        self.max_sessoes = max_sessoes
+        self._sessoes = OrderedDict()  # usuario -> (blob, ultimo_acesso, versao)
+        self._lock = threading.Lock()
+        self.metricas = _Metricas()
+
+    def carregar(self, usuario: str):
+        """Retorna (contexto, versao) do usuário; (None, 0) se não existe ou expirou."""
+        inicio = time.perf_counter()
+        with self._lock:
+            item = self._sessoes.get(usuario)
+            if item is not None and time.time() - item[1] > self.ttl:
+                del self._sessoes[usuario]
+                self.metricas.expiradas += 1
+                item = None
+            if item is None:
+                self.metricas.misses += 1
+                return None, 0
+            self._sessoes.move_to_end(usuario)
+            self.metricas.hits += 1
+        # desserializa fora do lock: cada chamada recebe a sua própria cópia
+        contexto = desserializar(item[0])
+        self.metricas.registrar_carga(inicio)
+        return contexto, item[2]
+
+    def salvar(self, usuario: str, contexto, versao: int = None) -> None:
+        """Grava o contexto; com `versao` (a do carregar), só se ninguém gravou depois."""
+        blob = serializar(contexto)
+        with self._lock:
+            atual = self._sessoes.get(usuario)
+            if versao is not None and atual is not None and atual[2] != versao:
+                self.metricas.conflitos += 1
+                raise SessaoConcorrenteError(f"sessão de {usuario} na versão {atual[2]}, esperada {versao}")
+            self._sessoes[usuario] = (blob, time.time(), (atual[2] if atual else 0) + 1)
+            self._sessoes.move_to_end(usuario)
+            while len(self._sessoes) > self.max_sessoes:
+                self._sessoes.popitem(last=False)
+                self.metricas.evictions += 1
+
+    def remover(self, usuario: str) -> None:
+        with self._lock:
+            self._sessoes.pop(usuario, None)
+
+    def estatisticas(self) -> dict:
+        resumo = self.metricas.resumo(len(self._sessoes))
+        resumo["bytes"] = sum(len(blob) for blob, _, _ in list(self._sessoes.values()))
+        return resumo
+
+
+class SessionStoreSQLite:
+    """Sessões num SQLite (WAL) compartilhado entre workers e reinícios."""
+
+    def __init__(self, caminho, ttl: float = 24 * 3600, max_sessoes: int = 10000):
+        self.ttl = ttl
+        self.max_sessoes = max_sessoes
+        self._lock = threading.Lock()
+        self.metricas = _Metricas()
+
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(caminho), check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessoes ("
+            " usuario TEXT PRIMARY KEY,"
+            " contexto BLOB NOT NULL,"
+            " ultimo_acesso REAL NOT NULL,"
+            " versao INTEGER NOT NULL DEFAULT 0)"
+        )
+        colunas = {linha[1] for linha in self._conn.execute("PRAGMA table_info(sessoes)")}
+        if "versao" not in colunas:  # tabela criada antes do controle de versão
+            self._conn.execute("ALTER TABLE sessoes ADD COLUMN versao INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_acesso ON sessoes (ultimo_acesso)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+
+    def carregar(self, usuario: str):
+        """Retorna (contexto, versao) do usuário; (None, 0) se não existe ou expirou."""
+        inicio = time.perf_counter()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT contexto, ultimo_acesso, versao FROM sessoes WHERE usuario = ?", (usuario,)
+            ).fetchone()
+            if row is not None and time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM sessoes WHERE usuario = ?", (usuario,))
+                self._conn.commit()
+                self.metricas.expiradas += 1
+                row = None
+            if row is None:
+                self.metricas.misses += 1
+                return None, 0
+            self.metricas.hits += 1
+        contexto = desserializar(row[0])
+        self.metricas.registrar_carga(inicio)
+        return contexto, row[2]
+
+    def salvar(self, usuario: str, contexto, versao: int = None) -> None:
+        """
+        Grava o contexto; com `versao` (a do carregar), só se a linha ainda estiver
+        nela. Cada comando é atômico no SQLite, então dois workers não passam juntos.
+        """
+        blob = serializar(contexto)
+        agora = time.time()
+        with self._lock:
+            if versao is None:
+                existia = self._conn.execute(
+                    "SELECT 1 FROM sessoes WHERE usuario = ?", (usuario,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT INTO sessoes (usuario, contexto, ultimo_acesso, versao) VALUES (?, ?, ?, 1)"
+                    " ON CONFLICT (usuario) DO UPDATE SET contexto = excluded.contexto,"
+                    " ultimo_acesso = excluded.ultimo_acesso, versao = sessoes.versao + 1",
+                    (usuario, blob, agora),
+                )
+                nova = not existia
+            else:
+                atualizou = self._conn.execute(
+                    "UPDATE sessoes SET contexto = ?, ultimo_acesso = ?, versao = versao + 1"
+                    " WHERE usuario = ? AND versao = ?",
+                    (blob, agora, usuario, versao),
+                ).rowcount
+                # Sem linha naquela versão: sessão nova (ou expirada), a menos que outro worker já a tenha criado
+                nova = not atualizou and self._conn.execute(
+                    "INSERT OR IGNORE INTO sessoes (usuario, contexto, ultimo_acesso, versao) VALUES (?, ?, ?, ?)",
+                    (usuario, blob, agora, versao + 1),
+                ).rowcount
+                if not atualizou and not nova:
+                    self._conn.rollback()  # nada foi gravado; libera o lock de escrita
+                    self.metricas.conflitos += 1
+                    raise SessaoConcorrenteError(f"sessão de {usuario} gravada por outro worker desde a versão {versao}")
+            if nova:
+                self._total += 1
+            if self._total > self.max_sessoes:
+                self._limpar()
+            self._conn.commit()
+
+    def remover(self, usuario: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessoes WHERE usuario = ?", (usuario,))
+            self._conn.commit()
+
+    def _limpar(self) -> None:
+        # Primeiro as expiradas; se ainda passar do limite, as menos usadas até ~90%
+        # (evita um DELETE a cada sessão nova). O total é recontado porque outros
+        # workers também inserem.
+        cur = self._conn.execute(
+            "DELETE FROM sessoes WHERE ultimo_acesso < ?", (time.time() - self.ttl,)
+        )
+        self.metricas.expiradas += cur.rowcount
+        self._total = self._conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+        excesso = self._total - int(self.max_sessoes * 0.9)
+        if excesso <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM sessoes WHERE rowid IN ("
+            " SELECT rowid FROM sessoes ORDER BY ultimo_acesso LIMIT ?)",
+            (excesso,),
+        )
+        self._total -= excesso
+        self.metricas.evictions += excesso
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total, tamanho = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(contexto)), 0) FROM sessoes"
+            ).fetchone()
+        resumo = self.metricas.resumo(total)
+        resumo["bytes"] = tamanho
+        return resumo
+
+
+def criar_session_store():
+    """Backend escolhido pelas variáveis SESSION_* (ver docstring do módulo)."""
+    tipo = os.getenv("SESSION_STORE", "sqlite").lower()
+    ttl = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+    max_sessoes = int(os.getenv("SESSION_MAX", "10000"))
+    if tipo == "memoria":
+        return SessionStoreMemoria(ttl=ttl, max_sessoes=max_sessoes)
+    if tipo == "sqlite":
+        caminho = os.getenv("SESSION_PATH", Path(__file__).parent / ".cache" / "sessoes.sqlite3")
+        return SessionStoreSQLite(caminho, ttl=ttl, max_sessoes=max_sessoes)
+    raise ValueError(f"SESSION_STORE inválido: {tipo!r} (use memoria ou sqlite)")
@@ -2,13 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import json
-import faiss
-import numpy as np
 from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from chunker import chunks_de_artigos, texto_para_embedding
+from dedup import colapsar_duplicatas, paragrafos_repetidos, remover_boilerplate
+from embedding_config import config_embedding
+from index_factory import config_do_ambiente
+from indexador import atualizar_base
+
 # Caminho para a raiz do projeto (contém o .env)
 PROJECT_ROOT = Path(__file__).parent.parent
 # Caminho para esta pasta (contém articles_data.js)
@@ -30,24 +35,59 @@ with open(js_path, "r", encoding="utf-8") as f:
 json_str = text.replace("export const articlesData = ", "").rstrip().rstrip(";")
 articles = json.loads(json_str)
 
-# 4) Gera embeddings
-emb_list = []
-for art in articles:
-    resp = client.embeddings.create(
-        model="text-embedding-ada-002",
-        input=art["content"]
+# 3.0) Tira parágrafos de boilerplate e colapsa artigos quase duplicados (INGEST_DEDUP=0 desliga)
+if os.getenv("INGEST_DEDUP", "1") != "0":
+    repetidos = paragrafos_repetidos(articles)
+    articles = [{**art, "content": remover_boilerplate(art["content"], repetidos)} for art in articles]
+    articles, colapsados = colapsar_duplicatas(articles)
+    print(f"{len(repetidos)} parágrafos de boilerplate removidos, {colapsados} artigos quase duplicados colapsados")
+
+# 3.1) Divide os artigos em chunks por parágrafo (CHUNK_MAX_TOKENS=0 indexa artigos inteiros)
+chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+if chunk_max_tokens > 0:
+    registros = chunks_de_artigos(
+        articles,
+        max_tokens=chunk_max_tokens,
+        overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "50")),
     )
-    emb_list.append(resp.data[0].embedding)
-embeddings = np.array(emb_list, dtype="float32")
+    textos = [texto_para_embedding(r) for r in registros]
+    print(f"{len(articles)} artigos divididos em {len(registros)} chunks")
+else:
+    registros = articles
+    textos = [art["content"] for art in articles]
 
-# 5) Cria e popula índice FAISS
-dim = embeddings.shape[1]
-index = faiss.IndexFlatL2(dim)
-index.add(embeddings)
+# 3.2) Modelo de embeddings (EMBEDDING_MODEL / EMBEDDING_DIMENSIONS). Com --candidato
+#      a base é gerada em candidato/ e publicada sem entrar em uso, para comparar
+#      com a atual (comparar_modelos.py) antes de trocar.
+embedding = config_embedding()
+candidato = "--candidato" in sys.argv[1:]
 
-# 6) Persiste o índice e os metadados aqui dentro de base_de_dados_vetorial
-faiss.write_index(index, str(VET_DIR / "articles_faiss.index"))
-with open(VET_DIR / "articles_metadata.json", "w", encoding="utf-8") as f:
-    json.dump(articles, f, ensure_ascii=False, indent=2)
+# 4) Atualiza a base: só registros novos/alterados vão para a API de embeddings,
+#    removidos saem do índice e cada registro mantém seu id estável no FAISS.
+#    Tipo de índice por FAISS_INDEX_TYPE (TIPOS_INDICE em index_factory.py):
+#    flat, hnsw, ivfflat, ivfpq, sq8, pq, flat16.
+config = config_do_ambiente()
+relatorio = atualizar_base(
+    client,
+    registros,
+    textos,
+    VET_DIR,
+    modelo=embedding["modelo"],
+    dimensoes=embedding["dimensoes"],
+    destino=VET_DIR / "candidato" if candidato else VET_DIR,
+    ativar=not candidato,
+    config_indice=config,
+    workers=int(os.getenv("EMBED_WORKERS", "4")),
+    # Chunks já são curtos; o snippet só se aplica a artigos inteiros
+    snippet_chars=None if chunk_max_tokens > 0 else int(os.getenv("METADATA_SNIPPET_CHARS", "500")) or None,
+)
 
-print(f"✅ Índice FAISS criado com {index.ntotal} vetores em {VET_DIR}")
+print(
+    f"   novos: {relatorio['novos']}, alterados: {relatorio['alterados']}, "
+    f"inalterados: {relatorio['inalterados']}, removidos: {relatorio['removidos']}, "
+    f"embedados agora: {relatorio['embedados']}"
+)
+print(f"✅ Índice FAISS ({config['tipo']}, {embedding['modelo']}) com {relatorio['total']} vetores "
+      f"em {VET_DIR} (versão {relatorio['versao']})")
+if candidato:
+    print(f"   Versão candidata, ainda fora de uso. Compare com: python comparar_modelos.py {relatorio['versao']}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice invertido BM25 (lexical) sobre os mesmos registros do índice FAISS.
+
+O id de cada documento é o mesmo id do FAISS/metadados, então os resultados
+das duas buscas podem ser combinados diretamente (ver rag_teste.py).
+
+A tokenização é pensada para português: minúsculas, remoção de acentos,
+stopwords e uma redução simples de plural ("admissões" -> "admissao").
+"""
+
+import json
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das",
+    "em", "no", "na", "nos", "nas", "por", "pelo", "pela", "pelos", "pelas", "para",
+    "pra", "com", "sem", "sob", "e", "ou", "que", "se", "como", "ao", "aos", "a",
+    "me", "te", "meu", "minha", "meus", "minhas", "seu", "sua", "seus", "suas",
+    "eu", "voce", "ele", "ela", "nos", "eles", "elas", "isso", "isto", "esse", "essa",
+    "este", "esta", "aquele", "aquela", "qual", "quais", "quando", "onde", "ja", "nao",
+    "sim", "mais", "muito", "tem", "ter", "ser", "estar", "e", "foi", "sao", "ha",
+    "posso", "pode", "consigo", "quero", "gostaria", "faco", "fazer",
+}
+
+
+def _sem_acentos(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _reduzir(termo: str) -> str:
+    """Redução leve de plural/sufixo, suficiente para casar singular e plural."""
+    if len(termo) <= 3:
+        return termo
+    for sufixo, troca in (("coes", "cao"), ("oes", "ao"), ("aes", "ao"), ("ais", "al"),
+                          ("eis", "el"), ("ns", "m"), ("res", "r"), ("zes", "z")):
+        if termo.endswith(sufixo):
+            return termo[: -len(sufixo)] + troca
+    if termo.endswith("s") and not termo.endswith("ss"):
+        return termo[:-1]
+    return termo
+
+
+def tokenizar(texto: str) -> list:
+    termos = re.findall(r"[a-z0-9]+", _sem_acentos(texto))
+    return [_reduzir(t) for t in termos if t not in STOPWORDS]
+
+
+class BM25Index:
+    """BM25 (Okapi) com listas de postings em memória."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = 0
+        self.avgdl = 0.0
+        self.doc_len = {}
+        self.postings = {}
+        self.idf = {}
+
+    @classmethod
+    def construir(cls, textos, k1: float = 1.2, b: float = 0.75):
+        """`textos` é uma lista onde a posição é o id do documento (None para ids vagos)."""
+        index = cls(k1, b)
+        postings = defaultdict(list)
+        for doc_id, texto in enumerate(textos):
+            if texto is None:
+                continue
+            termos = tokenizar(texto)
+            index.doc_len[doc_id] = len(termos)
+            for termo, tf in Counter(termos).items():
+                postings[termo].append((doc_id, tf))
+        index.postings = dict(postings)
+        index.n_docs = len(index.doc_len)
+        index.avgdl = sum(index.doc_len.values()) / index.n_docs if index.n_docs else 0.0
+        index._calcular_idf()
+        return index
+
+    def _calcular_idf(self) -> None:
+        self.idf = {
+            termo: math.log(1 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for termo, docs in self.postings.items()
+        }
+
+    def buscar(self, consulta: str, k: int = 10, permitidos=None) -> list:
+        """
+        Retorna [(doc_id, score)] em ordem decrescente de score.
+        Com `permitidos` (conjunto de ids), só esses documentos são pontuados.
+        """
+        scores = defaultdict(float)
+        for termo in set(tokenizar(consulta)):
+            docs = self.postings.get(termo)
+            if not docs:
+                continue
+            idf = self.idf[termo]
+            for doc_id, tf in docs:
+                if permitidos is not None and doc_id not in permitidos:
+                    continue
+                norm = 1 - self.b + self.b * self.doc_len[doc_id] / self.avgdl
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+    def score_maximo(self, consulta: str) -> float:
+        """Limite superior do score para a consulta (todos os termos, tf alto)."""
+        return sum(self.idf.get(t, 0.0) for t in set(tokenizar(consulta))) * (self.k1 + 1)
+
+    def salvar(self, caminho) -> None:
+        dados = {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_len": self.doc_len,
+            "postings": {t: [x for par in docs for x in par] for t, docs in self.postings.items()},
+        }
+        caminho = Path(caminho)
+        tmp = caminho.with_suffix(caminho.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False, separators=(",", ":"))
+        tmp.replace(caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        index = cls(dados["k1"], dados["b"])
+        index.doc_len = {int(d): n for d, n in dados["doc_len"].items()}
+        index.postings = {
+            t: list(zip(plano[0::2], plano[1::2])) for t, plano in dados["postings"].items()
+        }
+        index.n_docs = len(index.doc_len)
+        index.avgdl = sum(index.doc_len.values()) / index.n_docs if index.n_docs else 0.0
+        index._calcular_idf()
+        return index
+
+
+def texto_do_registro(registro) -> str:
+    """Texto indexado para um registro de metadados (título + conteúdo)."""
+    if registro is None:
+        return None
+    return f"{registro['title']}\n{registro['content']}"
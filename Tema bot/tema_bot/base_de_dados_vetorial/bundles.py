@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Versões publicadas da base vetorial ("bundles").
+
+Cada publicação copia índice, vetores, metadados, BM25 e limiar de relevância para
+bundles/<versão>/, junto com um manifest.json com o sha256 de cada arquivo.
+O arquivo CURRENT aponta para a versão em uso e é trocado com os.replace, que
+é atômico: um leitor vê a versão anterior inteira ou a nova inteira, nunca uma
+mistura de arquivos de rebuilds diferentes.
+
+Os bots em execução verificam o CURRENT de tempos em tempos (ver retriever.py)
+e trocam de versão sem reiniciar.
+
+O bundle leva também o articles_ids.json (chave do registro -> id no FAISS) com
+que foi gerado. Ao ativar uma versão, esse mapa passa a ser o da base, de modo
+que o próximo rebuild continua a numeração da versão em uso (uma candidata só
+mexe no mapa da base quando é ativada).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+ARQUIVOS = (
+    "articles_faiss.index",
+    "articles_embeddings.npy",
+    "articles_metadata.bin",
+    "articles_metadata.json",
+    "articles_bm25.json",
+    "relevancia.json",
+    "articles_ids.json",
+)
+MAPA_IDS = "articles_ids.json"
+PASTA_BUNDLES = "bundles"
+PONTEIRO = "CURRENT"
+
+
+def sha256_arquivo(caminho) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def versao_atual(base_dir):
+    """Nome da versão apontada pelo CURRENT, ou None se a base ainda não usa bundles."""
+    try:
+        return (Path(base_dir) / PONTEIRO).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def pasta_da_versao(base_dir, versao: str) -> Path:
+    return Path(base_dir) / PASTA_BUNDLES / versao
+
+
+def ler_manifesto(pasta) -> dict:
+    with open(Path(pasta) / "manifest.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verificar(pasta) -> bool:
+    """Confere os checksums do manifesto (arquivo truncado ou trocado = bundle inválido)."""
+    try:
+        manifesto = ler_manifesto(pasta)
+        return all(
+            sha256_arquivo(Path(pasta) / nome) == sha
+            for nome, sha in manifesto["arquivos"].items()
+        )
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def ativar(base_dir, versao: str) -> None:
+    """Aponta o CURRENT para `versao` (troca atômica) e promove o mapa de ids do bundle."""
+    pasta = pasta_da_versao(base_dir, versao)
+    if not pasta.is_dir():
+        raise FileNotFoundError(f"Versão {versao} não existe em {Path(base_dir) / PASTA_BUNDLES}")
+    if (pasta / MAPA_IDS).exists():
+        mapa_tmp = Path(base_dir) / f".{MAPA_IDS}.tmp"
+        shutil.copyfile(pasta / MAPA_IDS, mapa_tmp)
+        os.replace(mapa_tmp, Path(base_dir) / MAPA_IDS)
+    ponteiro_tmp = Path(base_dir) / f".{PONTEIRO}.tmp"
+    ponteiro_tmp.write_text(versao, encoding="utf-8")
+    os.replace(ponteiro_tmp, Path(base_dir) / PONTEIRO)
+
+
+def publicar(origem, base_dir=None, substituir: dict = None, manter: int = 3,
+             ativar_versao: bool = True, **extra) -> str:
+    """
+    Publica os arquivos de `origem` como uma nova versão e aponta o CURRENT para ela
+    (com ativar_versao=False a versão fica publicada como candidata, sem entrar em uso).
+    `substituir` troca arquivos específicos ({nome: caminho}); `extra` vai para o manifesto.
+    Mantém as `manter` versões mais recentes. Retorna o nome da versão.
+    """
+    origem = Path(origem)
+    base_dir = Path(base_dir or origem)
+    substituir = substituir or {}
+    raiz = base_dir / PASTA_BUNDLES
+    raiz.mkdir(exist_ok=True)
+
+    arquivos = {}
+    for nome in ARQUIVOS:
+        caminho = Path(substituir.get(nome, origem / nome))
+        if caminho.exists():
+            arquivos[nome] = caminho
+    # com o .bin presente o JSON de metadados é redundante
+    if "articles_metadata.bin" in arquivos:
+        arquivos.pop("articles_metadata.json", None)
+    if "articles_faiss.index" not in arquivos:
+        raise FileNotFoundError(f"Nenhum articles_faiss.index em {origem}")
+
+    tmp = raiz / f".tmp-{os.getpid()}-{time.time_ns()}"
+    tmp.mkdir()
+    checksums = {}
+    for nome, caminho in arquivos.items():
+        # cópia e não hard link: o rebuild regrava os arquivos da origem no mesmo inode
+        shutil.copyfile(caminho, tmp / nome)
+        checksums[nome] = sha256_arquivo(tmp / nome)
+
+    versao = time.strftime("%Y%m%dT%H%M%S") + "-" + checksums["articles_faiss.index"][:8]
+    if "relevancia.json" in checksums:
+        versao += checksums["relevancia.json"][:4]
+    manifesto = {"versao": versao, "criado_em": time.time(), "arquivos": checksums, **extra}
+    with open(tmp / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+    destino = raiz / versao
+    if destino.exists():
+        shutil.rmtree(tmp)
+    else:
+        os.rename(tmp, destino)
+
+    if ativar_versao:
+        ativar(base_dir, versao)
+
+    _limpar_antigas(raiz, versao_atual(base_dir), manter)
+    return versao
+
+
+def _limpar_antigas(raiz: Path, atual: str, manter: int) -> None:
+    # Processos que ainda têm o índice antigo em mmap continuam lendo normalmente:
+    # o arquivo só some do disco quando o último mapeamento é fechado.
+    versoes = sorted(p.name for p in raiz.iterdir() if p.is_dir() and not p.name.startswith("."))
+    for nome in versoes[:-manter] if manter > 0 else []:
+        if nome != atual:  # a versão em uso nunca é apagada, mesmo sendo antiga
+            shutil.rmtree(raiz / nome, ignore_errors=True)
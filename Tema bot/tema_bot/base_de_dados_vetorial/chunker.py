@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Divisão dos artigos em trechos (chunks) com sobreposição.
+
+O scraper junta os <p> de cada artigo com linhas em branco, então os cortes são
+feitos nas fronteiras de parágrafo. Parágrafos maiores que o limite são
+quebrados por frase (e, em último caso, por tamanho).
+
+Cada chunk guarda o id do artigo de origem (`article_id`) e a sua posição
+(`chunk`), para ser mapeado de volta ao artigo na hora da busca.
+"""
+
+import re
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _ENCODING = None
+
+
+def estimar_tokens(texto: str) -> int:
+    """Número de tokens do texto (tiktoken se instalado; senão ~4 caracteres por token)."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(texto))
+    return max(1, (len(texto) + 3) // 4)
+
+
+def _dividir_paragrafo(paragrafo: str, max_tokens: int) -> list:
+    if estimar_tokens(paragrafo) <= max_tokens:
+        return [paragrafo]
+    partes, atual = [], ""
+    for frase in re.split(r"(?<=[.!?;:])\s+", paragrafo):
+        candidato = f"{atual} {frase}".strip()
+        if atual and estimar_tokens(candidato) > max_tokens:
+            partes.append(atual)
+            candidato = frase
+        atual = candidato
+    if atual:
+        partes.append(atual)
+
+    # Frases ainda grandes demais são cortadas por contagem de tokens
+    resultado = []
+    for parte in partes:
+        if estimar_tokens(parte) > max_tokens:
+            resultado.extend(_cortar_por_tokens(parte, max_tokens))
+        else:
+            resultado.append(parte)
+    return resultado
+
+
+def _cortar_por_tokens(texto: str, max_tokens: int) -> list:
+    """Pedaços consecutivos de `texto` com no máximo `max_tokens` tokens cada."""
+    if _ENCODING is None:
+        max_chars = max_tokens * 4  # mesma conta de estimar_tokens
+        return [texto[i:i + max_chars] for i in range(0, len(texto), max_chars)]
+    tokens = _ENCODING.encode(texto)
+    _, inicios = _ENCODING.decode_with_offsets(tokens)  # caractere onde cada token começa
+    inicios = list(inicios) + [len(texto)]
+    pedacos, i = [], 0
+    while i < len(tokens):
+        fim = min(i + max_tokens, len(tokens))
+        # Recodificado sozinho, o pedaço pode dar um token a mais na borda: recua até caber
+        while fim - i > 1 and estimar_tokens(texto[inicios[i]:inicios[fim]]) > max_tokens:
+            fim -= 1
+        pedaco = texto[inicios[i]:inicios[fim]]
+        if pedaco:
+            pedacos.append(pedaco)
+        i = fim
+    return pedacos
+
+
+def dividir_em_chunks(texto: str, max_tokens: int = 300, overlap_tokens: int = 50) -> list:
+    """
+    Divide o texto em trechos de até `max_tokens`, repetindo no início de cada
+    trecho os últimos parágrafos do anterior (até `overlap_tokens`).
+    """
+    paragrafos = []
+    for p in re.split(r"\n\s*\n", texto):
+        p = p.strip()
+        if p:
+            paragrafos.extend(_dividir_paragrafo(p, max_tokens))
+
+    chunks, atual = [], []
+    tokens_atual = 0
+    for p in paragrafos:
+        tokens_p = estimar_tokens(p)
+        if atual and tokens_atual + tokens_p > max_tokens:
+            chunks.append("\n\n".join(atual))
+            # Sobreposição: reaproveita o final do chunk anterior
+            sobra, tokens_sobra = [], 0
+            for anterior in reversed(atual):
+                t = estimar_tokens(anterior)
+                if tokens_sobra + t > overlap_tokens or tokens_sobra + t + tokens_p > max_tokens:
+                    break
+                sobra.insert(0, anterior)
+                tokens_sobra += t
+            atual, tokens_atual = sobra, tokens_sobra
+        atual.append(p)
+        tokens_atual += tokens_p
+    if atual:
+        chunks.append("\n\n".join(atual))
+    return chunks
+
+
+CAMPOS_HERDADOS = ("aliases", "category", "section", "section_title")
+
+
+def chunks_de_artigos(articles, max_tokens: int = 300, overlap_tokens: int = 50) -> list:
+    """
+    Gera os registros de chunk (title, url, content, article_id, chunk) na ordem
+    dos artigos. Artigos sem texto viram um único chunk vazio, para não sumirem da base.
+    Campos herdados do artigo (aliases de quase duplicados, categoria e seção)
+    vão em cada chunk.
+    """
+    registros = []
+    for article_id, art in enumerate(articles):
+        trechos = dividir_em_chunks(art.get("content", ""), max_tokens, overlap_tokens) or [""]
+        for n, trecho in enumerate(trechos):
+            registros.append({
+                "title": art["title"],
+                "url": art["url"],
+                "content": trecho,
+                "article_id": article_id,
+                "chunk": n,
+                **{c: art[c] for c in CAMPOS_HERDADOS if art.get(c)},
+            })
+    return registros
+
+
+def texto_para_embedding(registro: dict) -> str:
+    """Texto enviado para a API de embeddings: título + trecho."""
+    if not registro["content"]:
+        return registro["title"]
+    return f"{registro['title']}\n\n{registro['content']}"
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detecção de artigos quase duplicados e de parágrafos de boilerplate na ingestão.
+
+Artigos: assinatura MinHash sobre shingles de 5 palavras do conteúdo e LSH por
+bandas para achar candidatos sem comparar todos os pares. Um artigo cuja
+similaridade de Jaccard estimada com um representante já visto passa do limiar
+é descartado e sua URL vira alias do representante (campo "aliases").
+
+Boilerplate: parágrafos idênticos (após normalizar) em vários artigos, como
+"Clique nos links abaixo para acessar a seção que desejar:", não dizem nada
+sobre o artigo e só ocupam espaço no contexto; são removidos antes do chunking.
+
+Relatório sobre o articles_data.js atual:
+    python dedup.py
+"""
+
+import json
+import math
+import re
+import sys
+import unicodedata
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+SHINGLE_PALAVRAS = 5
+N_PERMUTACOES = 128
+BANDAS = 32                # 32 bandas x 4 linhas: candidato a partir de Jaccard ~0.4
+LIMIAR_JACCARD = 0.85
+MIN_ARTIGOS_BOILERPLATE = 5     # ou 2% dos artigos, o que for maior
+MAX_PALAVRAS_BOILERPLATE = 20   # parágrafos longos repetidos costumam ser passo a passo de verdade
+
+_PRIMO = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, _PRIMO, size=N_PERMUTACOES, dtype=np.int64)
+_B = _rng.integers(0, _PRIMO, size=N_PERMUTACOES, dtype=np.int64)
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", texto))
+
+
+def shingles(texto: str, k: int = SHINGLE_PALAVRAS) -> set:
+    palavras = _normalizar(texto).split()
+    return {" ".join(palavras[i:i + k]) for i in range(len(palavras) - k + 1)}
+
+
+def assinatura(texto: str):
+    """MinHash do conteúdo, ou None se o texto é curto demais para ter shingles."""
+    sh = shingles(texto)
+    if not sh:
+        return None
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in sh), dtype=np.int64, count=len(sh))
+    # a*x + b cabe em int64: a < 2^31 e x < 2^32
+    return ((np.outer(_A, x) + _B[:, None]) % _PRIMO).min(axis=1)
+
+
+class DetectorDuplicatas:
+    """Índice LSH incremental: serve tanto para a ingestão em lote quanto para o pipeline."""
+
+    def __init__(self, limiar: float = LIMIAR_JACCARD, bandas: int = BANDAS):
+        self.limiar = limiar
+        self.bandas = bandas
+        self.linhas = N_PERMUTACOES // bandas
+        self._buckets = [{} for _ in range(bandas)]
+        self._assinaturas = []
+        self._itens = []
+
+    def _chaves(self, sig):
+        return [sig[b * self.linhas:(b + 1) * self.linhas].tobytes() for b in range(self.bandas)]
+
+    def verificar(self, texto: str, item):
+        """
+        Devolve o `item` representante de que `texto` é quase cópia, ou None;
+        neste caso `item` passa a representar o seu grupo.
+        """
+        sig = assinatura(texto)
+        if sig is None:
+            return None
+        chaves = self._chaves(sig)
+        candidatos = {i for b, chave in enumerate(chaves) for i in self._buckets[b].get(chave, ())}
+        for i in sorted(candidatos):
+            if float(np.mean(self._assinaturas[i] == sig)) >= self.limiar:
+                return self._itens[i]
+        novo = len(self._assinaturas)
+        self._assinaturas.append(sig)
+        self._itens.append(item)
+        for b, chave in enumerate(chaves):
+            self._buckets[b].setdefault(chave, []).append(novo)
+        return None
+
+
+def colapsar_duplicatas(articles, limiar: float = LIMIAR_JACCARD):
+    """
+    Mantém o primeiro artigo de cada grupo de quase duplicados, com as URLs dos
+    demais em "aliases". Retorna (artigos únicos, nº de artigos colapsados).
+    """
+    detector = DetectorDuplicatas(limiar)
+    unicos = []
+    for art in articles:
+        art = dict(art)
+        representante = detector.verificar(art.get("content", ""), art)
+        if representante is None:
+            unicos.append(art)
+        else:
+            representante.setdefault("aliases", []).append(art["url"])
+    return unicos, len(articles) - len(unicos)
+
+
+def paragrafos_repetidos(articles, min_artigos: int = None) -> set:
+    """
+    Parágrafos curtos (normalizados) que aparecem em pelo menos `min_artigos` artigos.
+    `articles` é percorrido uma vez só e pode ser um gerador; só os parágrafos
+    curtos o bastante para serem boilerplate entram na contagem.
+    """
+    contagem = Counter()
+    n_artigos = 0
+    for art in articles:
+        n_artigos += 1
+        normalizados = (_normalizar(p) for p in art.get("content", "").split("\n") if p.strip())
+        contagem.update({p for p in normalizados if p and len(p.split()) <= MAX_PALAVRAS_BOILERPLATE})
+    if min_artigos is None:
+        min_artigos = max(MIN_ARTIGOS_BOILERPLATE, math.ceil(0.02 * n_artigos))
+    return {p for p, n in contagem.items() if n >= min_artigos}
+
+
+def remover_boilerplate(texto: str, repetidos: set) -> str:
+    paragrafos = [p for p in texto.split("\n") if p.strip()]
+    return "\n\n".join(p for p in paragrafos if _normalizar(p) not in repetidos)
+
+
+if __name__ == "__main__":
+    origem = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "articles_data.js"
+    texto = origem.read_text(encoding="utf-8")
+    articles = json.loads(texto.replace("export const articlesData = ", "").rstrip().rstrip(";"))
+    repetidos = paragrafos_repetidos(articles)
+    print(f"{len(repetidos)} parágrafos de boilerplate:")
+    for p in sorted(repetidos):
+        print(f"   {p[:90]}")
+    limpos = [{**a, "content": remover_boilerplate(a["content"], repetidos)} for a in articles]
+    unicos, colapsados = colapsar_duplicatas(limpos)
+    print(f"{len(articles)} artigos -> {len(unicos)} ({colapsados} quase duplicados colapsados)")
+    for art in unicos:
+        if art.get("aliases"):
+            print(f"   {art['url']}\n      aliases: {art['aliases']}")
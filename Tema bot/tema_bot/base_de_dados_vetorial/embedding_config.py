@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Configuração do modelo de embeddings, compartilhada entre a ingestão e o bot.
+
+    EMBEDDING_MODEL       modelo da API (padrão text-embedding-ada-002)
+    EMBEDDING_DIMENSIONS  dimensão reduzida de saída, para modelos que aceitam o
+                          parâmetro `dimensions` (text-embedding-3-*); vazio = nativa
+
+O manifesto de cada bundle grava o modelo e a dimensão com que a base foi
+construída, e o bot embeda as perguntas com os da versão em uso. Assim a troca
+de modelo acompanha a troca de versão da base. A dimensão só é gravada quando
+EMBEDDING_DIMENSIONS foi definida; sem ela o modelo usa a sua dimensão nativa.
+"""
+
+import os
+
+MODELO_PADRAO = "text-embedding-ada-002"
+# modelos que não aceitam o parâmetro `dimensions` (a API rejeita a chamada)
+SEM_DIMENSOES = {"text-embedding-ada-002"}
+
+
+def config_embedding() -> dict:
+    return {
+        "modelo": os.getenv("EMBEDDING_MODEL", MODELO_PADRAO),
+        "dimensoes": int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None,
+    }
+
+
+def parametros_api(modelo: str, dimensoes: int = None) -> dict:
+    """Argumentos extras para client.embeddings.create (ada-002 não aceita `dimensions`)."""
+    return {"dimensions": dimensoes} if dimensoes and modelo not in SEM_DIMENSOES else {}
+
+
+def chave_modelo(modelo: str, dimensoes: int = None) -> str:
+    """Chave de cache/store: o mesmo modelo com outra dimensão gera outros vetores."""
+    return f"{modelo}@{dimensoes}" if dimensoes else modelo
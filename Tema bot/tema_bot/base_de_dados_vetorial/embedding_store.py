@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento persistente dos embeddings da base, chaveado por (modelo, sha256 do texto).
+
+Um texto que já foi embedado com o mesmo modelo nunca é enviado de novo à API,
+então re-indexar a base só paga pelos artigos novos ou alterados.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+
+def hash_texto(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, caminho):
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(caminho))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vetores ("
+            " modelo TEXT NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " vetor BLOB NOT NULL,"
+            " PRIMARY KEY (modelo, sha256))"
+        )
+        self._conn.commit()
+
+    def buscar(self, modelo: str, hashes) -> dict:
+        """{sha256: vetor} para os hashes já armazenados."""
+        encontrados = {}
+        hashes = list(set(hashes))
+        # Consulta em blocos para não estourar o limite de parâmetros do SQLite
+        for i in range(0, len(hashes), 500):
+            bloco = hashes[i:i + 500]
+            marcadores = ",".join("?" * len(bloco))
+            for sha, blob in self._conn.execute(
+                f"SELECT sha256, vetor FROM vetores WHERE modelo = ? AND sha256 IN ({marcadores})",
+                (modelo, *bloco),
+            ):
+                encontrados[sha] = np.frombuffer(blob, dtype="float32")
+        return encontrados
+
+    def guardar(self, modelo: str, hashes, vetores) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO vetores (modelo, sha256, vetor) VALUES (?, ?, ?)",
+            [(modelo, sha, np.asarray(v, dtype="float32").tobytes()) for sha, v in zip(hashes, vetores)],
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
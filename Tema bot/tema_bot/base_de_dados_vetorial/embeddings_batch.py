@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geração de embeddings em lotes, com concorrência limitada e retry.
+
+Os textos são agrupados em lotes sequenciais que respeitam o limite de itens e
+de tokens por requisição; os lotes são enviados por um pool de threads e o
+resultado é remontado na ordem original, então o i-ésimo vetor continua sendo
+o do i-ésimo texto (os ids do FAISS seguem alinhados com os metadados).
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import openai
+
+from chunker import estimar_tokens
+
+# Limites da API de embeddings por requisição
+MAX_ITENS_LOTE = 2048
+MAX_TOKENS_LOTE = 100_000
+
+
+def montar_lotes(textos, max_itens: int = MAX_ITENS_LOTE, max_tokens: int = MAX_TOKENS_LOTE) -> list:
+    """Agrupa os textos em lotes contíguos [(inicio, fim, tokens)]."""
+    lotes = []
+    inicio, tokens = 0, 0
+    for i, texto in enumerate(textos):
+        t = estimar_tokens(texto)
+        if i > inicio and (i - inicio >= max_itens or tokens + t > max_tokens):
+            lotes.append((inicio, i, tokens))
+            inicio, tokens = i, 0
+        tokens += t
+    if inicio < len(textos):
+        lotes.append((inicio, len(textos), tokens))
+    return lotes
+
+
+def _deve_repetir(erro) -> bool:
+    if isinstance(erro, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(erro, openai.APIStatusError) and erro.status_code >= 500
+
+
+def _espera(erro, tentativa: int, base: float, teto: float) -> float:
+    resposta = getattr(erro, "response", None)
+    retry_after = resposta.headers.get("retry-after") if resposta is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), teto)
+        except ValueError:
+            pass
+    return min(teto, base * 2 ** tentativa) * (0.5 + random.random() / 2)
+
+
+def _embed_lote(client, modelo, textos, tentativas, base, teto, extra):
+    for tentativa in range(tentativas):
+        try:
+            resp = client.embeddings.create(model=modelo, input=textos, **extra)
+            return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+        except Exception as e:
+            if not _deve_repetir(e) or tentativa == tentativas - 1:
+                raise
+            espera = _espera(e, tentativa, base, teto)
+            print(f"   ⚠ {type(e).__name__}; nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+
+
+def gerar_embeddings(client, textos, modelo: str = "text-embedding-ada-002", workers: int = 4,
+                     max_itens: int = MAX_ITENS_LOTE, max_tokens: int = MAX_TOKENS_LOTE,
+                     tentativas: int = 6, espera_base: float = 1.0, espera_max: float = 60.0,
+                     **extra) -> np.ndarray:
+    """
+    Embeddings (float32) de todos os textos, na mesma ordem da entrada.
+    `extra` é repassado à API (ex.: dimensions).
+    """
+    lotes = montar_lotes(textos, max_itens, max_tokens)
+    resultados = [None] * len(lotes)
+    total_tokens = sum(t for _, _, t in lotes)
+    print(f"Gerando embeddings de {len(textos)} textos (~{total_tokens} tokens) "
+          f"em {len(lotes)} lotes, {workers} em paralelo")
+
+    inicio = time.perf_counter()
+    feitos_tokens = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futuros = {
+            pool.submit(_embed_lote, client, modelo, textos[a:b], tentativas, espera_base, espera_max, extra): n
+            for n, (a, b, _) in enumerate(lotes)
+        }
+        for feitos, futuro in enumerate(as_completed(futuros), 1):
+            n = futuros[futuro]
+            resultados[n] = futuro.result()
+            feitos_tokens += lotes[n][2]
+            decorrido = time.perf_counter() - inicio
+            print(f"   [{feitos}/{len(lotes)}] lotes, {feitos_tokens / decorrido:,.0f} tokens/s")
+
+    vetores = [v for lote in resultados for v in lote]
+    return np.array(vetores, dtype="float32")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache HTTP em disco para o scraper da central de ajuda.
+
+Guarda, por URL, o corpo da última resposta 200 junto com ETag e Last-Modified.
+O scraper usa esses valores em requisições condicionais (If-None-Match /
+If-Modified-Since): uma resposta 304 é tratada como acerto e o corpo vem do
+cache, então páginas que não mudaram não trafegam de novo.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class HttpCache:
+    def __init__(self, caminho):
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(caminho), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS paginas ("
+            " url TEXT PRIMARY KEY,"
+            " corpo TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " verificado_em REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self.hits = 0          # 304 (ou leitura no modo só-cache)
+        self.misses = 0        # 200 com corpo novo
+        self.bytes_baixados = 0
+
+    def obter(self, url: str):
+        """(corpo, etag, last_modified) ou None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT corpo, etag, last_modified FROM paginas WHERE url = ?", (url,)
+            ).fetchone()
+
+    def cabecalhos_condicionais(self, url: str) -> dict:
+        entrada = self.obter(url)
+        if entrada is None:
+            return {}
+        _, etag, last_modified = entrada
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def guardar(self, url: str, corpo: str, etag=None, last_modified=None, tamanho: int = 0) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO paginas (url, corpo, etag, last_modified, verificado_em)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (url, corpo, etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+            self.misses += 1
+            self.bytes_baixados += tamanho
+
+    def confirmar(self, url: str) -> str:
+        """Registra um 304 e devolve o corpo em cache."""
+        with self._lock:
+            self._conn.execute("UPDATE paginas SET verificado_em = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+            self.hits += 1
+        return self.obter(url)[0]
+
+    def ler(self, url: str) -> str:
+        """Modo só-cache: corpo armazenado, sem rede."""
+        entrada = self.obter(url)
+        if entrada is None:
+            raise KeyError(f"URL fora do cache (modo só-cache): {url}")
+        with self._lock:
+            self.hits += 1
+        return entrada[0]
+
+    def resumo(self) -> str:
+        return (f"cache HTTP: {self.hits} sem mudança, {self.misses} baixadas, "
+                f"{self.bytes_baixados / 1024:.0f} KB transferidos")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Construção dos índices FAISS usados pela base vetorial.
+
+Tipos suportados (FAISS_INDEX_TYPE no .env):
+  - flat    : IndexFlatL2, busca exata (padrão, comportamento original)
+  - hnsw    : IndexHNSWFlat, grafo navegável; ajuste de busca via efSearch
+  - ivfflat : IndexIVFFlat, listas invertidas; ajuste de busca via nprobe
+  - ivfpq   : IndexIVFPQ, listas invertidas com vetores comprimidos por PQ
+  - sq8     : IndexScalarQuantizer 8 bits, busca exhaustiva com 1/4 da memória
+  - pq      : IndexPQ, busca exhaustiva sobre códigos PQ (pq_m bytes por vetor)
+  - flat16  : IndexScalarQuantizer float16, metade da memória, recall ~ exato
+
+Os parâmetros de busca (nprobe / efSearch) são passados por consulta via
+SearchParameters, sem alterar o estado do índice compartilhado entre threads.
+
+Nos tipos comprimidos a distância é aproximada; reordenar_exato re-pontua os
+candidatos com os vetores float32 originais (articles_embeddings.npy em mmap).
+"""
+
+import math
+import os
+
+import faiss
+import numpy as np
+
+TIPOS_INDICE = ("flat", "hnsw", "ivfflat", "ivfpq", "sq8", "pq", "flat16")
+
+
+def config_do_ambiente() -> dict:
+    """Lê o tipo de índice e os parâmetros de construção das variáveis de ambiente."""
+    config = {"tipo": os.getenv("FAISS_INDEX_TYPE", "flat").lower()}
+    for chave, env in (
+        ("hnsw_m", "FAISS_HNSW_M"),
+        ("ef_construction", "FAISS_HNSW_EF_CONSTRUCTION"),
+        ("nlist", "FAISS_IVF_NLIST"),
+        ("pq_m", "FAISS_PQ_M"),
+        ("pq_nbits", "FAISS_PQ_NBITS"),
+    ):
+        if os.getenv(env):
+            config[chave] = int(os.getenv(env))
+    return config
+
+
+def _pq_nbits(pq_nbits: int, n: int) -> int:
+    # k-means do PQ precisa de pelo menos 2^nbits pontos
+    return max(1, min(pq_nbits, int(math.log2(max(n, 2)))))
+
+
+def nlist_padrao(n: int) -> int:
+    """~4*sqrt(n) listas, respeitando o mínimo de ~39 pontos de treino por centróide."""
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def construir_indice(embeddings, tipo: str = "flat", hnsw_m: int = 32, ef_construction: int = 200,
+                     nlist: int = None, pq_m: int = 64, pq_nbits: int = 8, ids=None):
+    """
+    Cria, treina (se preciso) e popula um índice do tipo pedido.
+    Com `ids`, o índice é envolvido num IndexIDMap e cada vetor recebe o id dado.
+    """
+    n, dim = embeddings.shape
+
+    if tipo == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif tipo == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    elif tipo in ("ivfflat", "ivfpq"):
+        nlist = nlist or nlist_padrao(n)
+        quantizer = faiss.IndexFlatL2(dim)
+        if tipo == "ivfflat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            if dim % pq_m:
+                raise ValueError(f"FAISS_PQ_M={pq_m} precisa dividir a dimensão {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, _pq_nbits(pq_nbits, n))
+        index.train(embeddings)
+    elif tipo in ("sq8", "flat16"):
+        qtipo = faiss.ScalarQuantizer.QT_8bit if tipo == "sq8" else faiss.ScalarQuantizer.QT_fp16
+        index = faiss.IndexScalarQuantizer(dim, qtipo, faiss.METRIC_L2)
+        index.train(embeddings)
+    elif tipo == "pq":
+        if dim % pq_m:
+            raise ValueError(f"FAISS_PQ_M={pq_m} precisa dividir a dimensão {dim}")
+        index = faiss.IndexPQ(dim, pq_m, _pq_nbits(pq_nbits, n))
+        index.train(embeddings)
+    else:
+        raise ValueError(f"Tipo de índice desconhecido: {tipo}. Use um de {TIPOS_INDICE}")
+
+    if ids is not None:
+        index = faiss.IndexIDMap(index)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+    else:
+        index.add(embeddings)
+    return index
+
+
+def _indice_interno(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def aceita_seletor(index) -> bool:
+    """IndexPQ não aceita IDSelector na busca; os demais tipos de TIPOS_INDICE aceitam."""
+    return not isinstance(_indice_interno(index), faiss.IndexPQ)
+
+
+def parametros_busca(index, nprobe: int = None, ef_search: int = None, seletor=None):
+    """
+    Monta os SearchParameters para o tipo de índice (ou None se não houver ajuste).
+    Índices IVF / HNSW só aceitam a sua própria subclasse de parâmetros, então com
+    `seletor` (um faiss.IDSelector que restringe a busca a um subconjunto de ids)
+    ela é montada mesmo sem nprobe / ef_search, com os valores atuais do índice.
+    Para IndexPQ, que não aceita seletor, confira antes com aceita_seletor().
+    """
+    base = _indice_interno(index)
+    extra = {"sel": seletor} if seletor is not None else {}
+    if isinstance(base, faiss.IndexIVF) and (nprobe or seletor is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or base.nprobe, **extra)
+    if isinstance(base, faiss.IndexHNSW) and (ef_search or seletor is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or base.hnsw.efSearch, **extra)
+    if seletor is not None:
+        return faiss.SearchParameters(**extra)
+    return None
+
+
+def reordenar_exato(qvec, I, vetores, k: int):
+    """
+    Re-pontua os candidatos `I` (ids do índice, -1 = vazio) com a distância L2
+    exata contra `vetores` (matriz por id, pode ser um np.load com mmap_mode="r")
+    e devolve (D, I) com os k melhores de cada consulta.
+    """
+    D_out = np.full((len(qvec), k), np.inf, dtype="float32")
+    I_out = np.full((len(qvec), k), -1, dtype="int64")
+    for linha, (q, candidatos) in enumerate(zip(qvec, I)):
+        validos = candidatos[(candidatos >= 0) & (candidatos < len(vetores))]
+        if not len(validos):
+            continue
+        # np.take em ordem crescente lê as páginas do mmap sequencialmente
+        ordem = np.sort(validos)
+        dist = ((np.asarray(vetores[ordem], dtype="float32") - q) ** 2).sum(axis=1)
+        melhores = np.argsort(dist)[:k]
+        D_out[linha, :len(melhores)] = dist[melhores]
+        I_out[linha, :len(melhores)] = ordem[melhores]
+    return D_out, I_out
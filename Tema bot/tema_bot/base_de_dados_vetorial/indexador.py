@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Atualização incremental da base vetorial.
+
+Cada registro (artigo ou chunk) tem uma chave estável — a URL, ou "URL#n" para
+o n-ésimo chunk — e um id numérico persistido em articles_ids.json. Ids de
+registros removidos não são reaproveitados, então um id do FAISS aponta sempre
+para o mesmo registro nos metadados (que são gravados por id, com vagas nulas).
+
+Os vetores ficam no EmbeddingStore, chaveado por (modelo, sha256 do texto): só
+registros novos ou com texto alterado vão para a API. O índice é remontado a
+partir dos vetores armazenados, o que leva segundos e funciona para todos os
+tipos de índice (inclusive HNSW, que não suporta remoção).
+
+Ao final os arquivos servidos pelo bot são publicados como um novo bundle
+(ver bundles.py); bots em execução trocam de versão sem reiniciar.
+"""
+
+import json
+from collections.abc import Sequence
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+import bundles
+from bm25 import BM25Index, texto_do_registro
+from embedding_store import EmbeddingStore, hash_texto
+from embedding_config import MODELO_PADRAO, chave_modelo, parametros_api
+from embeddings_batch import gerar_embeddings
+from index_factory import construir_indice
+from metadata_store import escrever_store
+
+
+def chave_do_registro(registro: dict) -> str:
+    if "chunk" in registro:
+        return f"{registro['url']}#{registro['chunk']}"
+    return registro["url"]
+
+
+class MapaIds:
+    """Chave do registro -> id estável no FAISS, com o hash do texto da última indexação."""
+
+    def __init__(self, caminho, origem=None):
+        """Lê de `origem` (padrão: o próprio `caminho`) e grava em `caminho`."""
+        self.caminho = Path(caminho)
+        origem = Path(origem or caminho)
+        self.proximo_id = 0
+        self.ids = {}
+        self.hashes = {}
+        if origem.exists():
+            with open(origem, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            self.proximo_id = dados["proximo_id"]
+            self.ids = dados["ids"]
+            self.hashes = dados["hashes"]
+
+    def id_de(self, chave: str) -> int:
+        if chave not in self.ids:
+            self.ids[chave] = self.proximo_id
+            self.proximo_id += 1
+        return self.ids[chave]
+
+    def salvar(self) -> None:
+        tmp = self.caminho.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"proximo_id": self.proximo_id, "ids": self.ids, "hashes": self.hashes},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        tmp.replace(self.caminho)
+
+
+class _PorId(Sequence):
+    """Registros na ordem dos ids (None nas vagas), lidos de `registros` só quando percorridos."""
+
+    def __init__(self, registros, posicoes: list):
+        self._registros = registros
+        self._posicoes = posicoes
+
+    def __len__(self) -> int:
+        return len(self._posicoes)
+
+    def __getitem__(self, id_: int):
+        pos = self._posicoes[id_]
+        return None if pos is None else self._registros[pos]
+
+
+def _gravar_lista_json(itens, caminho) -> None:
+    """Mesmo texto de json.dump(itens, indent=2), escrito item a item."""
+    with open(caminho, "w", encoding="utf-8") as f:
+        separador = "\n  "
+        f.write("[")
+        for item in itens:
+            f.write(separador + json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+            separador = ",\n  "
+        f.write("]" if separador == "\n  " else "\n]")
+
+
+def atualizar_base(client, registros, textos, vet_dir, modelo: str = MODELO_PADRAO,
+                   config_indice: dict = None, workers: int = 4, snippet_chars: int = None,
+                   dimensoes: int = None, destino=None, ativar: bool = True) -> dict:
+    """
+    Re-indexa a base: embeda só o que mudou, remove o que sumiu e regrava
+    índice, vetores, metadados e BM25. Retorna as contagens da atualização.
+    `destino` (padrão: vet_dir) recebe os arquivos gerados; com ativar=False o
+    bundle é publicado como candidato (ex.: base com outro modelo de embeddings,
+    servida só depois da comparação A/B).
+    """
+    vet_dir = Path(vet_dir)
+    chave_store = chave_modelo(modelo, dimensoes)
+    store = EmbeddingStore(vet_dir / "embeddings_store.sqlite3")
+
+    # Registros repetidos (mesma URL/chunk) ficam só na primeira ocorrência
+    unicos = {}
+    for reg, texto in zip(registros, textos):
+        chave = chave_do_registro(reg)
+        if chave in unicos:
+            print(f"   ⚠ registro repetido ignorado: {chave}")
+            continue
+        unicos[chave] = (reg, texto)
+    registros = [reg for reg, _ in unicos.values()]
+    hashes = [hash_texto(texto) for _, texto in unicos.values()]
+    textos = [texto for _, texto in unicos.values()]
+
+    # Embeddings: reaproveita o store e só chama a API para hashes desconhecidos
+    vetores = store.buscar(chave_store, hashes)
+    faltantes = {}
+    for sha, texto in zip(hashes, textos):
+        if sha not in vetores:
+            faltantes.setdefault(sha, texto)
+    if faltantes:
+        novos = gerar_embeddings(client, list(faltantes.values()), modelo=modelo, workers=workers,
+                                 **parametros_api(modelo, dimensoes))
+        store.guardar(chave_store, list(faltantes), novos)
+        vetores.update(zip(faltantes, novos))
+    store.close()
+
+    embeddings = np.vstack([vetores[sha] for sha in hashes]).astype("float32")
+    relatorio = gravar_base(registros, hashes, embeddings, vet_dir, modelo=modelo, dimensoes=dimensoes,
+                            config_indice=config_indice, snippet_chars=snippet_chars,
+                            destino=destino, ativar=ativar)
+    relatorio["embedados"] = len(faltantes)
+    return relatorio
+
+
+def gravar_base(registros, hashes, embeddings, vet_dir, modelo: str = MODELO_PADRAO,
+                config_indice: dict = None, snippet_chars: int = None,
+                dimensoes: int = None, destino=None, ativar: bool = True) -> dict:
+    """
+    Metade final de atualizar_base, para quem já tem os vetores: `hashes[i]` é o
+    sha256 do texto embedado de `registros[i]` e `embeddings[i]` o seu vetor
+    (pode ser um np.memmap; as linhas são lidas só na montagem do índice).
+    `registros` só precisa de len(), iteração e acesso por posição: o pipeline
+    passa os registros gravados em disco e eles são relidos ao gravar os arquivos.
+    Atribui os ids, remove o que sumiu, grava os arquivos e publica o bundle.
+    """
+    vet_dir = Path(vet_dir)
+    destino = Path(destino or vet_dir)
+    destino.mkdir(parents=True, exist_ok=True)
+    config_indice = config_indice or {"tipo": "flat"}
+    # Candidata: parte do mapa da base, mas grava o seu no destino; ele só
+    # substitui o da base quando o bundle for ativado (bundles.ativar)
+    mapa_base = vet_dir / bundles.MAPA_IDS
+    mapa = MapaIds(mapa_base if ativar else destino / bundles.MAPA_IDS, origem=mapa_base)
+
+    chaves, posicoes, vistas = [], [], set()
+    for i, reg in enumerate(registros):
+        chave = chave_do_registro(reg)
+        if chave in vistas:
+            print(f"   ⚠ registro repetido ignorado: {chave}")
+            continue
+        vistas.add(chave)
+        chaves.append(chave)
+        posicoes.append(i)
+    if len(posicoes) < len(registros):
+        hashes = [hashes[i] for i in posicoes]
+        embeddings = embeddings[posicoes]
+
+    relatorio = {"novos": 0, "alterados": 0, "inalterados": 0, "removidos": 0, "embedados": 0}
+    for chave, sha in zip(chaves, hashes):
+        anterior = mapa.hashes.get(chave)
+        if anterior is None:
+            relatorio["novos"] += 1
+        elif anterior != sha:
+            relatorio["alterados"] += 1
+        else:
+            relatorio["inalterados"] += 1
+    atuais = set(chaves)
+    removidas = [c for c in mapa.ids if c not in atuais]
+    relatorio["removidos"] = len(removidas)
+    for chave in removidas:
+        del mapa.ids[chave]
+        mapa.hashes.pop(chave, None)
+
+    ids = np.array([mapa.id_de(c) for c in chaves], dtype="int64")
+    for chave, sha in zip(chaves, hashes):
+        mapa.hashes[chave] = sha
+
+    index = construir_indice(embeddings, ids=ids, **config_indice)
+
+    # Metadados, vetores e BM25 são gravados por id (ids vagos ficam nulos/zerados)
+    posicao_do_id = [None] * mapa.proximo_id
+    for id_, pos in zip(ids, posicoes):
+        posicao_do_id[id_] = pos
+    por_id = _PorId(registros, posicao_do_id)
+
+    faiss.write_index(index, str(destino / "articles_faiss.index"))
+    matriz = np.lib.format.open_memmap(destino / "articles_embeddings.npy", mode="w+", dtype="float32",
+                                       shape=(mapa.proximo_id, embeddings.shape[1]))  # nasce zerada
+    matriz[ids] = embeddings
+    matriz.flush()
+    del matriz
+    _gravar_lista_json(por_id, destino / "articles_metadata.json")
+    escrever_store(por_id, destino / "articles_metadata.bin", snippet_chars=snippet_chars)
+    BM25Index.construir(texto_do_registro(r) for r in por_id).salvar(destino / "articles_bm25.json")
+    mapa.salvar()
+
+    relatorio["total"] = index.ntotal
+    relatorio["versao"] = bundles.publicar(
+        destino, base_dir=vet_dir, ativar_versao=ativar,
+        modelo=modelo, dimensoes=dimensoes, total=index.ntotal,
+    )
+    return relatorio
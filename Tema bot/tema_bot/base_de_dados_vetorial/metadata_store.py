@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento binário dos metadados dos artigos (substitui o articles_metadata.json).
+
+Formato do arquivo (little-endian):
+
+    b"TMETA001"                       magic
+    uint32                            tamanho do cabeçalho JSON
+    cabeçalho JSON                    {"n": N, "campos": [...], "campos_json": [...], "snippet_chars": ...}
+    tabela de offsets                 N * len(campos) entradas de (uint64 offset, uint32 tamanho)
+    blob UTF-8                        textos concatenados
+
+O registro `i` corresponde ao id `i` do índice FAISS. A busca é O(1): calcula a
+posição na tabela, lê offset/tamanho e decodifica só os campos daquele registro.
+O arquivo é aberto via mmap, então o conteúdo é compartilhado entre os workers
+e nada é carregado até ser lido.
+
+Registros ausentes (ids sem artigo) são marcados com offset AUSENTE.
+
+Conversão do JSON existente:
+    python metadata_store.py articles_metadata.json articles_metadata.bin --snippet 500
+"""
+
+import argparse
+import json
+import mmap
+import shutil
+import struct
+from pathlib import Path
+
+MAGIC = b"TMETA001"
+ENTRADA = struct.Struct("<QI")
+AUSENTE = 0xFFFFFFFFFFFFFFFF
+CAMPOS_PADRAO = ("title", "url", "content")
+
+
+def escrever_store(registros, destino, campos=None, snippet_chars=None) -> None:
+    """
+    Grava os registros (lista de dicts, ou None para ids vagos) no formato binário.
+    Com `snippet_chars`, o campo `content` já sai truncado nesse tamanho.
+    `registros` pode ser qualquer sequência re-iterável (ex.: lida do disco sob
+    demanda): os textos vão direto para um arquivo temporário, não para a memória.
+    """
+    if campos is None:
+        campos = list(CAMPOS_PADRAO)
+        for reg in registros:
+            for chave in (reg or {}):
+                if chave not in campos:
+                    campos.append(chave)
+    campos_json = sorted({
+        c for reg in registros if reg for c in campos
+        if c in reg and reg[c] is not None and not isinstance(reg[c], str)
+    })
+
+    destino = Path(destino)
+    tmp = destino.with_suffix(destino.suffix + ".tmp")
+    tmp_blob = destino.with_suffix(destino.suffix + ".blob.tmp")
+    tabela = bytearray()
+    n = tam_blob = 0
+    with open(tmp_blob, "wb") as blob:
+        for reg in registros:
+            n += 1
+            for campo in campos:
+                if reg is None:
+                    tabela += ENTRADA.pack(AUSENTE, 0)
+                    continue
+                valor = reg.get(campo, "")
+                if campo in campos_json:
+                    valor = json.dumps(valor, ensure_ascii=False, separators=(",", ":"))
+                elif valor is None:
+                    valor = ""
+                if campo == "content" and snippet_chars:
+                    valor = valor[:snippet_chars]
+                dados = valor.encode("utf-8")
+                tabela += ENTRADA.pack(tam_blob, len(dados))
+                blob.write(dados)
+                tam_blob += len(dados)
+
+    cabecalho = json.dumps({
+        "n": n,
+        "campos": campos,
+        "campos_json": campos_json,
+        "snippet_chars": snippet_chars,
+    }).encode("utf-8")
+
+    with open(tmp, "wb") as f, open(tmp_blob, "rb") as blob:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(cabecalho)))
+        f.write(cabecalho)
+        f.write(tabela)
+        shutil.copyfileobj(blob, f)
+    tmp_blob.unlink()
+    tmp.replace(destino)
+
+
+class MetadataStore:
+    """Leitura dos metadados por id do FAISS, direto do arquivo em mmap."""
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        with open(self.caminho, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Arquivo de metadados inválido: {self.caminho}")
+        pos = len(MAGIC)
+        (tam_cabecalho,) = struct.unpack_from("<I", self._mm, pos)
+        pos += 4
+        cabecalho = json.loads(self._mm[pos:pos + tam_cabecalho].decode("utf-8"))
+        pos += tam_cabecalho
+
+        self.n = cabecalho["n"]
+        self.campos = cabecalho["campos"]
+        self.snippet_chars = cabecalho.get("snippet_chars")
+        self._campos_json = set(cabecalho.get("campos_json", []))
+        self._tabela = pos
+        self._blob = pos + self.n * len(self.campos) * ENTRADA.size
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _ler(self, idx: int, pos_campo: int):
+        pos = self._tabela + (idx * len(self.campos) + pos_campo) * ENTRADA.size
+        offset, tamanho = ENTRADA.unpack_from(self._mm, pos)
+        if offset == AUSENTE:
+            return None
+        inicio = self._blob + offset
+        texto = self._mm[inicio:inicio + tamanho].decode("utf-8")
+        if self.campos[pos_campo] in self._campos_json:
+            return json.loads(texto)
+        return texto
+
+    def get(self, idx: int, campo: str, padrao=None):
+        """Lê um único campo do registro `idx`."""
+        if campo not in self.campos or not 0 <= idx < self.n:
+            return padrao
+        valor = self._ler(idx, self.campos.index(campo))
+        return padrao if valor is None else valor
+
+    def __getitem__(self, idx: int):
+        """Registro `idx` como dict (None se o id estiver vago)."""
+        if idx < 0:
+            idx += self.n
+        if not 0 <= idx < self.n:
+            raise IndexError(idx)
+        if self._ler(idx, 0) is None:
+            return None
+        return {campo: self._ler(idx, i) for i, campo in enumerate(self.campos)}
+
+    def __iter__(self):
+        for idx in range(self.n):
+            yield self[idx]
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def converter_json(origem, destino, snippet_chars=None) -> int:
+    """Converte um articles_metadata.json (lista de artigos) para o formato binário."""
+    with open(origem, "r", encoding="utf-8") as f:
+        registros = json.load(f)
+    escrever_store(registros, destino, snippet_chars=snippet_chars)
+    return len(registros)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte articles_metadata.json para o formato binário.")
+    parser.add_argument("origem", nargs="?", default=Path(__file__).parent / "articles_metadata.json")
+    parser.add_argument("destino", nargs="?", default=Path(__file__).parent / "articles_metadata.bin")
+    parser.add_argument("--snippet", type=int, default=None,
+                        help="trunca o content nesse número de caracteres")
+    args = parser.parse_args()
+
+    total = converter_json(args.origem, args.destino, snippet_chars=args.snippet)
+    print(f"✅ {total} registros gravados em {args.destino}")
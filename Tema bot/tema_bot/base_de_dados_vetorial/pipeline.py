@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ingestão em fluxo, da coleta ao índice, numa execução só:
+
+    descobrir → baixar → extrair → limpar → deduplicar → chunk → embedar → indexar
+
+Cada etapa é um gerador e roda na sua própria thread, ligada à seguinte por uma
+fila limitada: a memória fica constante e uma etapa lenta segura as anteriores.
+
+Retomada: cada artigo extraído é gravado em pipeline_checkpoint.jsonl. Se a
+execução cair, a próxima relê o checkpoint, pula o download do que já foi
+extraído e continua dali. Embeddings já gerados ficam no EmbeddingStore e não
+voltam para a API. Ao final o checkpoint vira o articles_data.js (para o
+basevetorial.py continuar funcionando) e é apagado.
+
+Os vetores de cada lote embedado são anexados a pipeline_vetores.f32 (lido
+depois como np.memmap) e os registros, com o texto, a pipeline_registros.jsonl:
+até o fim ficam em memória só o offset e o sha256 de cada registro. A montagem
+final usa gravar_base, a mesma do indexador (ids estáveis, remoção do que
+sumiu), que relê os registros do disco ao gravar metadados e BM25. O boilerplate
+da coleta anterior é aprendido lendo o articles_data.js artigo a artigo.
+
+Uso:
+    python pipeline.py             # varredura completa (ou retoma o checkpoint)
+    python pipeline.py --do-zero   # ignora o checkpoint existente
+"""
+
+import json
+import os
+import queue
+import re
+import sys
+import threading
+from collections import deque
+from collections.abc import Sequence
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI
+
+import scrape_and_vector_ingest as scraper
+from chunker import chunks_de_artigos, texto_para_embedding
+from dedup import DetectorDuplicatas, paragrafos_repetidos, remover_boilerplate
+from embedding_config import chave_modelo, config_embedding, parametros_api
+from embedding_store import EmbeddingStore, hash_texto
+from embeddings_batch import gerar_embeddings
+from index_factory import config_do_ambiente
+from indexador import gravar_base
+
+PROJECT_ROOT = Path(__file__).parent.parent
+VET_DIR = Path(__file__).parent
+CHECKPOINT = VET_DIR / "pipeline_checkpoint.jsonl"
+VETORES = VET_DIR / "pipeline_vetores.f32"
+REGISTROS = VET_DIR / "pipeline_registros.jsonl"
+
+EMBEDDING = config_embedding()
+TAMANHO_FILA = int(os.getenv("PIPELINE_FILA", "64"))
+LOTE_EMBEDDING = int(os.getenv("PIPELINE_LOTE_EMBEDDING", "256"))
+FSYNC_A_CADA = int(os.getenv("PIPELINE_FSYNC_A_CADA", "50"))
+
+_FIM = object()
+
+
+def em_thread(iteravel, maxsize: int = TAMANHO_FILA):
+    """
+    Consome `iteravel` numa thread e entrega os itens por uma fila limitada.
+    Exceções da etapa são relançadas no consumidor.
+    """
+    fila = queue.Queue(maxsize=maxsize)
+
+    def produzir():
+        try:
+            for item in iteravel:
+                fila.put(item)
+        except BaseException as e:
+            fila.put(e)
+        else:
+            fila.put(_FIM)
+
+    threading.Thread(target=produzir, daemon=True).start()
+    while True:
+        item = fila.get()
+        if item is _FIM:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def _mapa_em_janela(executor, funcao, itens, janela: int):
+    """executor.map com no máximo `janela` tarefas em voo; devolve (item, resultado) em ordem."""
+    pendentes = deque()
+    for item, args in itens:
+        pendentes.append((item, executor.submit(funcao, *args)))
+        if len(pendentes) >= janela:
+            anterior, futuro = pendentes.popleft()
+            yield anterior, futuro.result()
+    while pendentes:
+        anterior, futuro = pendentes.popleft()
+        yield anterior, futuro.result()
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint
+# ---------------------------------------------------------------------------
+
+def ler_checkpoint(caminho=CHECKPOINT):
+    """Artigos já extraídos, um por linha, lidos sob demanda."""
+    if not Path(caminho).exists():
+        return
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            yield json.loads(linha)
+
+
+def checkpoint_para_js(caminho=CHECKPOINT, dest=VET_DIR / "articles_data.js") -> None:
+    """Converte o checkpoint no articles_data.js artigo a artigo, sem carregar tudo."""
+    tmp = Path(dest).with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("export const articlesData = [")
+        for n, art in enumerate(ler_checkpoint(caminho)):
+            f.write(",\n  " if n else "\n  ")
+            f.write(json.dumps(art, ensure_ascii=False))
+        f.write("\n];")
+    tmp.replace(dest)
+
+
+class Checkpoint:
+    def __init__(self, caminho=CHECKPOINT):
+        # Uma queda no meio da escrita deixa a última linha sem "\n": descarta o pedaço
+        if Path(caminho).exists():
+            with open(caminho, "rb+") as f:
+                dados = f.read()
+                f.truncate(dados.rfind(b"\n") + 1)
+        self._f = open(caminho, "a", encoding="utf-8")
+        self._desde_fsync = 0
+
+    def gravar(self, artigo: dict) -> None:
+        self._f.write(json.dumps(artigo, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self._desde_fsync += 1
+        if self._desde_fsync >= FSYNC_A_CADA:
+            os.fsync(self._f.fileno())
+            self._desde_fsync = 0
+
+    def close(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+
+
+# ---------------------------------------------------------------------------
+# Etapas
+# ---------------------------------------------------------------------------
+
+def descobrir():
+    secs, arts = scraper.collect_sections_and_direct_articles()
+    yield from arts
+    seen = {a["url"] for a in arts}
+    yield from scraper.collect_articles_from_sections(secs, seen)
+
+
+def baixar(links, ja_extraidos: set):
+    """(link, html) em paralelo, pulando o que já está no checkpoint."""
+    pendentes = ((link, (link["url"],)) for link in links if link["url"] not in ja_extraidos)
+    with ThreadPoolExecutor(max_workers=scraper.WORKERS) as pool:
+        yield from _mapa_em_janela(pool, scraper.fetch_html, pendentes, scraper.WORKERS * 2)
+
+
+def extrair(paginas, checkpoint: Checkpoint):
+    """Parsing no pool de processos; cada artigo extraído vai para o checkpoint."""
+    trabalhos = ((link, (html, link["title"])) for link, html in paginas)
+    with ProcessPoolExecutor(max_workers=scraper.PROCESSOS_PARSE) as pool:
+        for link, (title, content) in _mapa_em_janela(pool, scraper.parse_article, trabalhos,
+                                                      (os.cpu_count() or 1) * 2):
+            artigo = {"title": title, "url": link["url"], "content": content, **scraper.origem_do_link(link)}
+            checkpoint.gravar(artigo)
+            print(f"   extraído: {title or link['url']}")
+            yield artigo
+
+
+def limpar(artigos):
+    """Normaliza espaços (inclusive &nbsp;) e descarta parágrafos vazios."""
+    for art in artigos:
+        paragrafos = (re.sub(r"[ \t\u00a0]+", " ", p).strip() for p in art["content"].split("\n"))
+        yield {**art, "content": "\n\n".join(p for p in paragrafos if p)}
+
+
+def deduplicar(artigos, repetidos: set, aliases: dict):
+    """
+    Remove o boilerplate e descarta quase duplicados de artigos já vistos. As URLs
+    descartadas são anotadas em `aliases` (URL do representante -> aliases), pois
+    o representante já pode ter seguido adiante quando a cópia aparece.
+    """
+    detector = DetectorDuplicatas()
+    for art in artigos:
+        art = {**art, "content": remover_boilerplate(art["content"], repetidos)}
+        representante = detector.verificar(art["content"], art["url"])
+        if representante is None:
+            yield art
+        else:
+            aliases.setdefault(representante, []).append(art["url"])
+
+
+def dividir(artigos, max_tokens: int, overlap_tokens: int):
+    """Chunks por artigo; com max_tokens=0 o artigo inteiro é o registro."""
+    for article_id, art in enumerate(artigos):
+        if max_tokens <= 0:
+            yield art, art["content"]
+            continue
+        for reg in chunks_de_artigos([art], max_tokens, overlap_tokens):
+            reg["article_id"] = article_id
+            yield reg, texto_para_embedding(reg)
+
+
+def _embedar_lote(client, store, lote, workers):
+    """Vetores do lote, na ordem, vindos do store ou (os que faltam) da API."""
+    chave = chave_modelo(EMBEDDING["modelo"], EMBEDDING["dimensoes"])
+    hashes = [hash_texto(texto) for _, texto in lote]
+    vetores = store.buscar(chave, hashes)
+    faltantes = {}
+    for sha, (_, texto) in zip(hashes, lote):
+        if sha not in vetores:
+            faltantes.setdefault(sha, texto)
+    if faltantes:
+        novos = gerar_embeddings(client, list(faltantes.values()), modelo=EMBEDDING["modelo"],
+                                 workers=workers, **parametros_api(EMBEDDING["modelo"], EMBEDDING["dimensoes"]))
+        store.guardar(chave, list(faltantes), novos)
+        vetores.update(zip(faltantes, novos))
+    return hashes, np.vstack([vetores[sha] for sha in hashes]).astype("float32"), len(faltantes)
+
+
+def embedar(registros, client, workers: int):
+    """
+    Embeda os registros em lotes de LOTE_EMBEDDING e entrega, por lote,
+    (registros, hashes dos textos, matriz de vetores, nº de textos enviados à API).
+    """
+    store = EmbeddingStore(VET_DIR / "embeddings_store.sqlite3")
+    lote = []
+    try:
+        for item in registros:
+            lote.append(item)
+            if len(lote) >= LOTE_EMBEDDING:
+                yield ([reg for reg, _ in lote], *_embedar_lote(client, store, lote, workers))
+                lote = []
+        if lote:
+            yield ([reg for reg, _ in lote], *_embedar_lote(client, store, lote, workers))
+    finally:
+        store.close()
+
+
+class RegistrosEmDisco(Sequence):
+    """
+    Registros gravados um por linha em JSON; em memória fica só o offset de cada um.
+    Os `aliases` (URL -> URLs colapsadas) são aplicados na leitura, pois só ficam
+    completos depois que o último artigo passa pela deduplicação.
+    """
+
+    def __init__(self, caminho, offsets: list, aliases: dict = None):
+        self._f = open(caminho, "rb")
+        self._offsets = offsets
+        self._aliases = aliases if aliases is not None else {}
+
+    def _completar(self, reg: dict) -> dict:
+        if reg["url"] in self._aliases:
+            reg["aliases"] = self._aliases[reg["url"]]
+        return reg
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, i: int) -> dict:
+        self._f.seek(self._offsets[i])
+        return self._completar(json.loads(self._f.readline()))
+
+    def __iter__(self):
+        self._f.seek(0)
+        for _ in self._offsets:
+            yield self._completar(json.loads(self._f.readline()))
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def acumular(lotes, caminho=VETORES, caminho_registros=REGISTROS, aliases: dict = None):
+    """
+    Anexa os vetores de cada lote a `caminho` (float32 cru) e os registros a
+    `caminho_registros` (JSON por linha). Devolve (registros como RegistrosEmDisco,
+    hashes, vetores como np.memmap, nº de textos enviados à API).
+    """
+    offsets, hashes, embedados, dim = [], [], 0, None
+    with open(caminho, "wb") as f, open(caminho_registros, "wb") as f_regs:
+        for regs, shas, vetores, novos in lotes:
+            vetores.tofile(f)
+            for reg in regs:
+                offsets.append(f_regs.tell())
+                f_regs.write((json.dumps(reg, ensure_ascii=False) + "\n").encode("utf-8"))
+            hashes.extend(shas)
+            embedados += novos
+            dim = vetores.shape[1]
+    if not offsets:
+        raise RuntimeError("Nenhum registro para indexar; a base atual foi mantida.")
+    registros = RegistrosEmDisco(caminho_registros, offsets, aliases)
+    return registros, hashes, np.memmap(caminho, dtype="float32", mode="r", shape=(len(offsets), dim)), embedados
+
+
+def main():
+    args = sys.argv[1:]
+    load_dotenv(PROJECT_ROOT / ".env")
+    key = os.getenv("OPENAI_API_KEY")
+    if not key:
+        raise RuntimeError("OPENAI_API_KEY não foi carregada. Verifique o .env na raiz do projeto.")
+    client = OpenAI(api_key=key)
+
+    workers = int(os.getenv("EMBED_WORKERS", "4"))
+    chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+    chunk_overlap = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+    snippet_chars = None if chunk_max_tokens > 0 else int(os.getenv("METADATA_SNIPPET_CHARS", "500")) or None
+
+    if "--do-zero" in args and CHECKPOINT.exists():
+        CHECKPOINT.unlink()
+    checkpoint = Checkpoint()
+    aliases = {}
+    ja_extraidos = {a["url"] for a in ler_checkpoint()}
+    if ja_extraidos:
+        print(f"Retomando: {len(ja_extraidos)} artigos já extraídos no checkpoint")
+    # só as linhas da execução anterior: as novas chegam pela etapa de extração
+    retomados = islice(ler_checkpoint(), len(ja_extraidos))
+
+    try:
+        links = em_thread(descobrir())
+        paginas = em_thread(baixar(links, ja_extraidos))
+        novos = em_thread(extrair(paginas, checkpoint))
+
+        def artigos():
+            yield from retomados
+            yield from novos
+
+        limpos = em_thread(limpar(artigos()))
+        if os.getenv("INGEST_DEDUP", "1") != "0":
+            # boilerplate aprendido com a coleta anterior (o corpus atual ainda está chegando)
+            limpos = em_thread(deduplicar(limpos, paragrafos_repetidos(scraper.iterar_js()), aliases))
+        registros = em_thread(dividir(limpos, chunk_max_tokens, chunk_overlap))
+        registros, hashes, vetores, embedados = acumular(em_thread(embedar(registros, client, workers)),
+                                                         aliases=aliases)
+    finally:
+        checkpoint.close()
+
+    if aliases:
+        print(f"{sum(map(len, aliases.values()))} artigos quase duplicados colapsados")
+
+    relatorio = gravar_base(
+        registros, hashes, vetores, VET_DIR,
+        modelo=EMBEDDING["modelo"], dimensoes=EMBEDDING["dimensoes"],
+        config_indice=config_do_ambiente(), snippet_chars=snippet_chars,
+    )
+    relatorio["embedados"] = embedados
+    del vetores
+    registros.close()
+    VETORES.unlink()
+    REGISTROS.unlink()
+    checkpoint_para_js()
+    CHECKPOINT.unlink()
+    print(
+        f"   novos: {relatorio['novos']}, alterados: {relatorio['alterados']}, "
+        f"inalterados: {relatorio['inalterados']}, removidos: {relatorio['removidos']}, "
+        f"embedados agora: {relatorio['embedados']}"
+    )
+    print(f"✅ Índice FAISS com {relatorio['total']} vetores em {VET_DIR} (versão {relatorio['versao']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,45 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import time
 import json
-from urllib.parse import urljoin
+import random
+import re
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
 from pathlib import Path
 
 import cloudscraper
 from bs4 import BeautifulSoup
+from requests.exceptions import ConnectionError, HTTPError, Timeout
 
-BASE_URL     = 'https://ajuda.solides.com.br'
-CATEGORY_URL = urljoin(BASE_URL, '/hc/pt-br/categories/25325496607885')
+from http_cache import HttpCache
+
+# Podem ser trocados por variáveis de ambiente (ex.: servidor HTTP local de teste)
+BASE_URL     = os.getenv('SCRAPER_BASE_URL', 'https://ajuda.solides.com.br')
+CATEGORY_URL = os.getenv('SCRAPER_CATEGORY_URL', urljoin(BASE_URL, '/hc/pt-br/categories/25325496607885'))
+
+# concorrência e limite de requisições por host (token bucket)
+WORKERS         = int(os.getenv('SCRAPER_WORKERS', '8'))
+RATE_POR_HOST   = float(os.getenv('SCRAPER_RATE', '4'))     # requisições/s
+BURST_POR_HOST  = int(os.getenv('SCRAPER_BURST', '4'))
+MAX_TENTATIVAS  = int(os.getenv('SCRAPER_TENTATIVAS', '4'))
+PROCESSOS_PARSE = int(os.getenv('SCRAPER_PROCESSOS_PARSE', '0')) or None  # None = nº de CPUs
+
+# cache HTTP em disco (requisições condicionais) e modo só-cache para re-parsing
+CACHE_HTTP = os.getenv('SCRAPER_CACHE', '1') != '0'
+CACHE_ONLY = os.getenv('SCRAPER_CACHE_ONLY', '0') == '1'
+
+# descoberta incremental (--delta): 'sitemap' (lastmod do sitemap.xml; categoria/seção vêm
+# da coleta anterior e a listagem só é lida para ids novos) ou 'listagem' (API do help
+# center ordenada por updated_at)
+DESCOBERTA  = os.getenv('SCRAPER_DESCOBERTA', 'sitemap')
+SITEMAP_URL = os.getenv('SCRAPER_SITEMAP_URL', urljoin(BASE_URL, '/hc/sitemap.xml'))
 
 # configura o cloudscraper pra parecer um Chrome real
 SCRAPER = cloudscraper.create_scraper(
@@ -20,92 +49,421 @@ SCRAPER = cloudscraper.create_scraper(
         'Chrome/114.0.5735.199 Safari/537.36'
     )}
 )
+# pool de conexões do tamanho do nº de workers (reuso de conexão keep-alive). O
+# adaptador HTTPS é o do cloudscraper (cipher suite / fingerprint TLS): só o pool
+# dele é redimensionado, sem trocá-lo por um HTTPAdapter comum.
+for _adaptador in SCRAPER.adapters.values():
+    _adaptador._pool_connections = _adaptador._pool_maxsize = WORKERS
+    _adaptador.init_poolmanager(WORKERS, WORKERS, block=_adaptador._pool_block)
 
 # pasta de saída
 BASE_DIR = Path(__file__).parent
 VET_DIR  = BASE_DIR
 VET_DIR.mkdir(exist_ok=True)
 
+_HTTP_CACHE = None
+_HTTP_CACHE_LOCK = threading.Lock()
+
+
+def http_cache():
+    """Cache HTTP aberto sob demanda (os processos de parsing nunca o usam)."""
+    global _HTTP_CACHE
+    with _HTTP_CACHE_LOCK:
+        if _HTTP_CACHE is None:
+            _HTTP_CACHE = HttpCache(VET_DIR / ".http_cache.sqlite3")
+        return _HTTP_CACHE
+
+
+class TokenBucket:
+    """Limitador de taxa: até `burst` requisições seguidas, repondo `rate` por segundo."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.atualizado = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (agora - self.atualizado) * self.rate)
+                self.atualizado = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.rate
+            time.sleep(espera)
+
+
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def _bucket(url):
+    host = urlparse(url).netloc
+    with _BUCKETS_LOCK:
+        if host not in _BUCKETS:
+            _BUCKETS[host] = TokenBucket(RATE_POR_HOST, BURST_POR_HOST)
+        return _BUCKETS[host]
+
+
+def fetch_html(url):
+    """
+    Baixa a página respeitando o limite por host, com retry para 429/5xx e falhas de rede.
+    Com o cache ligado, a requisição é condicional e um 304 devolve o corpo salvo.
+    """
+    if CACHE_ONLY:
+        return http_cache().ler(url)
+    headers = http_cache().cabecalhos_condicionais(url) if CACHE_HTTP else {}
+    for tentativa in range(MAX_TENTATIVAS):
+        _bucket(url).aguardar()
+        try:
+            resp = SCRAPER.get(url, timeout=10, headers=headers)
+        except (ConnectionError, Timeout) as e:
+            erro = e
+        else:
+            if resp.status_code == 304 and headers:
+                return http_cache().confirmar(url)
+            if resp.status_code != 429 and resp.status_code < 500:
+                resp.raise_for_status()
+                if CACHE_HTTP:
+                    http_cache().guardar(
+                        url, resp.text,
+                        etag=resp.headers.get('ETag'),
+                        last_modified=resp.headers.get('Last-Modified'),
+                        tamanho=len(resp.content),
+                    )
+                return resp.text
+            erro = HTTPError(f"HTTP {resp.status_code}", response=resp)
+        if tentativa == MAX_TENTATIVAS - 1:
+            raise erro
+        espera = min(30, 2 ** tentativa) * (0.5 + random.random() / 2)
+        print(f"   ⚠ {url}: {erro}; nova tentativa em {espera:.1f}s")
+        time.sleep(espera)
+
 
 def get_soup(url):
-    resp = SCRAPER.get(url, timeout=10)
-    resp.raise_for_status()
-    return BeautifulSoup(resp.text, 'html.parser')
+    return BeautifulSoup(fetch_html(url), 'html.parser')
+
 
+# ---------------------------------------------------------------------------
+# Extração (funções puras sobre o HTML; rodam no pool de processos)
+# ---------------------------------------------------------------------------
 
-def collect_sections_and_direct_articles():
+def parse_article_list(html, base_url, todas=True):
+    """
+    Lê os itens de <ul class="article-list"> e devolve [(title, href_absoluto, href_original)].
+    Com todas=False só a primeira lista é considerada (páginas de seção).
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    uls = soup.find_all('ul', class_='article-list') if todas else [soup.find('ul', class_='article-list')]
+    itens = []
+    for ul in uls:
+        if not ul:
+            continue
+        for li in ul.find_all('li', class_='article-list-item'):
+            a = li.find('a', class_='article-list-item__link')
+            itens.append((a.get_text(strip=True), urljoin(base_url, a['href']), a['href']))
+    return itens
+
+
+def parse_article(html, fallback_title):
+    """Extrai (title, content) da página de um artigo."""
+    soup = BeautifulSoup(html, 'html.parser')
+    h1 = soup.find('h1')
+    title = h1.get_text(strip=True) if h1 else fallback_title
+
+    # seletor atualizado e fallback
+    body = (
+        soup.select_one('div.article-body') or
+        soup.select_one('div.article__body') or
+        soup.select_one('article.article-body') or
+        soup.select_one('div.article__content')
+    )
+    if not body:
+        body = soup.find('article')
+    if body:
+        paras = body.find_all('p')
+        content = "\n\n".join(p.get_text(strip=True) for p in paras) if paras else body.get_text(strip=True)
+    else:
+        content = ""
+    return title, content
+
+
+def fetch_and_parse(urls, parser, args_por_url, rotulos=None):
+    """
+    Baixa as URLs em paralelo (threads) e entrega cada HTML ao pool de processos
+    para o parsing, fora do caminho de I/O. Os resultados voltam na ordem de `urls`.
+    """
+    resultados = [None] * len(urls)
+    with ThreadPoolExecutor(max_workers=WORKERS) as io_pool, \
+            ProcessPoolExecutor(max_workers=PROCESSOS_PARSE) as cpu_pool:
+        downloads = {io_pool.submit(fetch_html, url): i for i, url in enumerate(urls)}
+        parses = {}
+        for fut in as_completed(downloads):
+            i = downloads[fut]
+            parses[cpu_pool.submit(parser, fut.result(), *args_por_url[i])] = i
+        for feitos, fut in enumerate(as_completed(parses), 1):
+            i = parses[fut]
+            resultados[i] = fut.result()
+            if rotulos:
+                print(f"[{feitos}/{len(urls)}] {rotulos[i]}")
+    return resultados
+
+
+# campos de origem (ids de categoria/seção do help center) que seguem do link para o artigo
+CAMPOS_ORIGEM = ('category', 'section', 'section_title')
+
+
+def id_zendesk(url, tipo):
+    """Id numérico de /categories/<id>-... ou /sections/<id>-... na URL (ou None)."""
+    m = re.search(rf'/{tipo}/(\d+)', urlparse(url).path)
+    return m.group(1) if m else None
+
+
+def origem_do_link(link):
+    return {c: link[c] for c in CAMPOS_ORIGEM if link.get(c)}
+
+
+def collect_sections_and_direct_articles(base_url=BASE_URL, category_url=CATEGORY_URL):
     """
     Agora varre todas as <ul class="article-list"> da página de categoria,
     capturando seções (links contendo '/sections/') e artigos diretos.
+    Cada item leva o id da categoria; seções levam também o próprio id.
     """
-    soup = get_soup(CATEGORY_URL)
     secs, arts = [], []
+    categoria = id_zendesk(category_url, 'categories')
 
     # pega TODAS as listas de artigos (RH, Benefícios, Academy…)
-    for ul in soup.find_all('ul', class_='article-list'):
-        for li in ul.find_all('li', class_='article-list-item'):
-            a = li.find('a', class_='article-list-item__link')
-            href = urljoin(BASE_URL, a['href'])
-            title = a.get_text(strip=True)
-
-            # separa seções de artigos diretos
-            if '/sections/' in a['href']:
-                secs.append({'title': title, 'url': href})
-            elif '/articles/' in a['href']:
-                arts.append({'title': title, 'url': href})
+    for title, href, raw in parse_article_list(fetch_html(category_url), base_url):
+        # separa seções de artigos diretos
+        if '/sections/' in raw:
+            secs.append({'title': title, 'url': href, 'category': categoria,
+                         'section': id_zendesk(href, 'sections')})
+        elif '/articles/' in raw:
+            arts.append({'title': title, 'url': href, 'category': categoria})
 
     return secs, arts
 
 
-def collect_articles_from_sections(secs, seen):
-    new = []
+def collect_articles_from_sections(secs, seen, base_url=BASE_URL):
     for sec in secs:
         print(f" ↳ entrando em seção: {sec['title']}")
-        soup = get_soup(sec['url'])
-        ul   = soup.find('ul', class_='article-list')
-        if not ul:
-            continue
-        for li in ul.find_all('li', class_='article-list-item'):
-            a = li.find('a', class_='article-list-item__link')
-            href = urljoin(BASE_URL, a['href'])
-            title = a.get_text(strip=True)
-            if '/articles/' in a['href'] and href not in seen:
+    listas = fetch_and_parse(
+        [sec['url'] for sec in secs],
+        parse_article_list,
+        [(base_url, False)] * len(secs),
+    )
+
+    # dedup na ordem das seções, igual à varredura sequencial
+    new = []
+    for sec, itens in zip(secs, listas):
+        for title, href, raw in itens:
+            if '/articles/' in raw and href not in seen:
                 seen.add(href)
-                new.append({'title': title, 'url': href})
-        time.sleep(0.5)
+                new.append({'title': title, 'url': href, 'category': sec.get('category'),
+                            'section': sec.get('section'), 'section_title': sec['title']})
     return new
 
 
 def scrape_articles_content(links):
-    out = []
-    for i, art in enumerate(links, 1):
-        print(f"[{i}/{len(links)}] {art['title']}")
-        soup = get_soup(art['url'])
-        h1 = soup.find('h1')
-        title = h1.get_text(strip=True) if h1 else art['title']
-
-        # seletor atualizado e fallback
-        body = (
-            soup.select_one('div.article-body') or
-            soup.select_one('div.article__body') or
-            soup.select_one('article.article-body') or
-            soup.select_one('div.article__content')
-        )
-        if not body:
-            body = soup.find('article')
-        if body:
-            paras = body.find_all('p')
-            content = "\n\n".join(p.get_text(strip=True) for p in paras) if paras else body.get_text(strip=True)
-        else:
-            content = ""
+    extraidos = fetch_and_parse(
+        [art['url'] for art in links],
+        parse_article,
+        [(art['title'],) for art in links],
+        rotulos=[art['title'] or art['url'] for art in links],
+    )
+    return [
+        {'title': title, 'url': art['url'], 'content': content, **origem_do_link(art)}
+        for art, (title, content) in zip(links, extraidos)
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Descoberta incremental: só artigos alterados desde a última coleta
+# ---------------------------------------------------------------------------
+
+def _instante(texto):
+    """ISO 8601 (com 'Z' ou só a data) -> datetime com fuso UTC."""
+    dt = datetime.fromisoformat(texto.strip().replace('Z', '+00:00'))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def carregar_watermark():
+    caminho = VET_DIR / "crawl_watermark.json"
+    if not caminho.exists():
+        return None
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return _instante(json.load(f)['lastmod'])
+
+
+def salvar_watermark(instante):
+    caminho = VET_DIR / "crawl_watermark.json"
+    tmp = caminho.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'lastmod': instante.isoformat(), 'modo': DESCOBERTA}, f)
+    tmp.replace(caminho)
+
+
+def parse_sitemap(xml):
+    """
+    Lê um sitemap (ou índice de sitemaps) e devolve ([(loc, lastmod)], [sitemaps filhos]).
+    lastmod vem como string ou None.
+    """
+    raiz = ET.fromstring(xml)
+    local = lambda el: el.tag.rsplit('}', 1)[-1]
+    urls, filhos = [], []
+    for item in raiz:
+        campos = {local(c): (c.text or '').strip() for c in item}
+        if not campos.get('loc'):
+            continue
+        if local(item) == 'sitemap':
+            filhos.append(campos['loc'])
+        elif local(item) == 'url':
+            urls.append((campos['loc'], campos.get('lastmod') or None))
+    return urls, filhos
+
+
+def artigos_da_categoria(base_url=BASE_URL, category_url=CATEGORY_URL):
+    """
+    Links dos artigos da categoria (diretos e das seções), com categoria/seção,
+    indexados pelo id do artigo. Só páginas de listagem: com o cache HTTP, quase tudo 304.
+    """
+    secs, arts = collect_sections_and_direct_articles(base_url, category_url)
+    arts.extend(collect_articles_from_sections(secs, {a['url'] for a in arts}, base_url))
+    return {id_zendesk(a['url'], 'articles') or a['url']: a for a in arts}
+
+
+def descobrir_pelo_sitemap(desde, existentes=(), base_url=BASE_URL, category_url=CATEGORY_URL,
+                           sitemap_url=SITEMAP_URL):
+    """
+    Artigos da categoria com lastmod no sitemap posterior a `desde`.
+    Devolve (alterados, urls_vigentes_da_categoria, maior_lastmod).
+    O sitemap cobre o locale inteiro e não diz a categoria: os ids já coletados
+    (`existentes`, a versão anterior do articles_data.js) levam a categoria/seção
+    guardada. Só quando aparece um id nunca visto, alterado desde `desde`, a listagem
+    da categoria (e das seções) é percorrida para classificá-lo; sem ids novos, o
+    custo é o sitemap. Artigo que troca de categoria sem id novo fica até a coleta completa.
+    """
+    conhecidos = {id_zendesk(a['url'], 'articles') or a['url']: a for a in existentes}
+    pendentes, alterados, vigentes, novos, maior = [sitemap_url], [], set(), set(), desde
+    while pendentes:
+        urls, filhos = parse_sitemap(fetch_html(pendentes.pop()))
+        pendentes.extend(filhos)
+        for loc, lastmod in urls:
+            id_artigo = id_zendesk(loc, 'articles')
+            if id_artigo is None:
+                continue
+            instante = _instante(lastmod) if lastmod else None
+            alterado = desde is None or instante is None or instante > desde
+            art = conhecidos.get(id_artigo)
+            if art is not None:
+                vigentes.add(art['url'])
+                if alterado:
+                    alterados.append({'title': art.get('title', ''), 'url': art['url'], **origem_do_link(art)})
+            elif alterado:
+                novos.add(id_artigo)  # pode ser de outra categoria: decide a listagem
+            else:
+                continue
+            if instante and (maior is None or instante > maior):
+                maior = instante
+
+    if novos:
+        print(f"   {len(novos)} ids nunca vistos no sitemap: conferindo a listagem da categoria")
+        categoria = artigos_da_categoria(base_url, category_url)
+        alterados.extend(link for id_artigo, link in categoria.items() if id_artigo in novos)
+        # a listagem recém-lida é a fonte exata das vigentes (pega também mudanças de categoria)
+        vigentes = {a['url'] for a in categoria.values()}
+    return alterados, vigentes, maior
+
+
+def descobrir_pela_listagem(desde, base_url=BASE_URL, category_url=CATEGORY_URL):
+    """
+    Pagina a listagem da categoria ordenada por updated_at (mais recentes primeiro)
+    e para no primeiro artigo já coletado: o custo é proporcional às mudanças.
+    Não enxerga remoções. Devolve (alterados, None, maior_updated_at).
+    """
+    m = re.search(r'/hc/([^/]+)/categories/(\d+)', urlparse(category_url).path)
+    if not m:
+        raise ValueError(f"não sei extrair locale/categoria de {category_url}")
+    locale, categoria = m.groups()
+    url = urljoin(base_url, f'/api/v2/help_center/{locale}/categories/{categoria}/articles.json'
+                            '?sort_by=updated_at&sort_order=desc&per_page=100')
+    alterados, maior = [], desde
+    while url:
+        pagina = json.loads(fetch_html(url))
+        for art in pagina.get('articles', []):
+            instante = _instante(art['updated_at'])
+            if desde is not None and instante <= desde:
+                return alterados, None, maior
+            if not art.get('draft'):
+                alterados.append({'title': art.get('title', ''), 'url': art['html_url'],
+                                  'category': categoria, 'section': str(art.get('section_id') or '')})
+            if maior is None or instante > maior:
+                maior = instante
+        url = pagina.get('next_page')
+    return alterados, None, maior
+
+
+_SEPARADORES = re.compile(r'[\s,]*')
+
+
+def iterar_js(src=None, bloco=1 << 16):
+    """Artigos do articles_data.js um a um, lendo o arquivo em blocos (sem carregá-lo inteiro)."""
+    src = src or VET_DIR / "articles_data.js"
+    if not Path(src).exists():
+        return
+    decoder = json.JSONDecoder()
+    with open(src, 'r', encoding='utf-8') as f:
+        buf = ''
+        while '[' not in buf:  # pula o "export const articlesData = "
+            mais = f.read(bloco)
+            if not mais:
+                return
+            buf += mais
+        pos = buf.index('[') + 1
+        while True:
+            pos = _SEPARADORES.match(buf, pos).end()
+            if pos == len(buf):
+                buf, pos = f.read(bloco), 0
+                if not buf:
+                    return
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                art, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # artigo cortado no fim do bloco: lê mais e tenta de novo
+                mais = f.read(bloco)
+                if not mais:
+                    raise
+                buf, pos = buf[pos:] + mais, 0
+                continue
+            yield art
 
-        out.append({'title': title, 'url': art['url'], 'content': content})
-        time.sleep(0.5)
-    return out
 
+def load_js(src=None):
+    return list(iterar_js(src))
 
-def save_js(data):
-    dest = VET_DIR / "articles_data.js"
+
+def mesclar(existentes, novos, vigentes=None):
+    """
+    Substitui por URL, acrescenta os novos e, se `vigentes` vier, descarta o que saiu do site.
+    Campos que a descoberta não conhece (ex.: categoria/seção no modo sitemap) vêm da versão anterior.
+    """
+    por_url = {a['url']: a for a in existentes}
+    for art in novos:
+        por_url[art['url']] = {**por_url.get(art['url'], {}), **art}
+    if vigentes is not None:
+        por_url = {u: a for u, a in por_url.items() if u in vigentes}
+    return list(por_url.values())
+
+
+def save_js(data, dest=None):
+    dest = dest or VET_DIR / "articles_data.js"
     with open(dest, 'w', encoding='utf-8') as f:
         f.write('export const articlesData = ')
         json.dump(data, f, ensure_ascii=False, indent=2)
@@ -113,13 +471,39 @@ def save_js(data):
     print(f"\n✅ Gravados {len(data)} artigos em {dest}")
 
 
-def main():
+def main_delta(base_url=BASE_URL, category_url=CATEGORY_URL, dest=None):
+    """Coleta só o que mudou desde a última execução e mescla no articles_data.js."""
+    inicio = time.perf_counter()
+    desde = carregar_watermark()
+    print(f"1) Descobrindo artigos alterados ({DESCOBERTA}) desde {desde or 'o início'}…")
+    existentes = load_js(dest)
+    if DESCOBERTA == 'listagem':
+        links, vigentes, maior = descobrir_pela_listagem(desde, base_url, category_url)
+    else:
+        links, vigentes, maior = descobrir_pelo_sitemap(desde, existentes, base_url, category_url)
+    print(f"   → {len(links)} artigos alterados")
+
+    print("\n2) Raspando conteúdo dos artigos…")
+    data = mesclar(existentes, scrape_articles_content(links), vigentes)
+
+    print("\n3) Salvando em JS…")
+    save_js(data, dest)
+    # só avança a marca depois de gravar: uma falha no meio repete a coleta
+    if maior is not None:
+        salvar_watermark(maior)
+    print(f"   ({time.perf_counter() - inicio:.1f}s)")
+    if CACHE_HTTP or CACHE_ONLY:
+        print(f"   {http_cache().resumo()}")
+
+
+def main(base_url=BASE_URL, category_url=CATEGORY_URL, dest=None):
+    inicio = time.perf_counter()
     print("1) Coletando seções e artigos diretos…")
-    secs, arts = collect_sections_and_direct_articles()
+    secs, arts = collect_sections_and_direct_articles(base_url, category_url)
     print(f"   → {len(secs)} seções, {len(arts)} artigos diretos")
 
     seen = {a['url'] for a in arts}
-    more = collect_articles_from_sections(secs, seen)
+    more = collect_articles_from_sections(secs, seen, base_url)
     print(f"   → +{len(more)} artigos de seções")
     arts.extend(more)
 
@@ -127,8 +511,18 @@ def main():
     data = scrape_articles_content(arts)
 
     print("\n3) Salvando em JS…")
-    save_js(data)
+    save_js(data, dest)
+    print(f"   ({time.perf_counter() - inicio:.1f}s)")
+    if CACHE_HTTP or CACHE_ONLY:
+        print(f"   {http_cache().resumo()}")
 
 
 if __name__ == '__main__':
-    main()
+    # --cache-only: re-parsing determinístico a partir do cache, sem rede
+    if '--cache-only' in sys.argv[1:]:
+        CACHE_ONLY = True
+    # --delta: descoberta incremental pelo sitemap/listagem em vez da varredura completa
+    if '--delta' in sys.argv[1:]:
+        main_delta()
+    else:
+        main()
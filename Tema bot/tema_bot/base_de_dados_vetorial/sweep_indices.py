@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Varredura de tipos de índice / parâmetros de busca contra o IndexFlatL2 exato.
+
+Para cada configuração reporta recall@k (em relação ao flat), latência p50/p99
+por consulta, tempo de construção e memória do índice serializado (total e
+bytes por vetor), para escolher o trade-off com dados. Com --rerank N os tipos
+comprimidos buscam N*k candidatos e reordenam pela distância exata, como o
+Retriever faz com FAISS_RERANK.
+
+Uso:
+    python sweep_indices.py                  # usa articles_embeddings.npy (ou reconstrói do índice flat)
+    python sweep_indices.py --queries q.npy  # embeddings de perguntas reais
+    python sweep_indices.py -k 3 --tipos hnsw ivfflat
+    python sweep_indices.py --tipos flat sq8 pq flat16 --rerank 4
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from index_factory import construir_indice, parametros_busca, reordenar_exato
+
+VET_DIR = Path(__file__).parent
+
+# Grade padrão de parâmetros: (parâmetros de construção, nome do parâmetro de busca, valores)
+GRADE = {
+    "flat": [({}, None, [None])],
+    "hnsw": [({"hnsw_m": m}, "ef_search", [16, 32, 64, 128, 256]) for m in (16, 32)],
+    "ivfflat": [({}, "nprobe", [1, 2, 4, 8, 16, 32, 64])],
+    "ivfpq": [({"pq_m": m}, "nprobe", [1, 4, 16, 64]) for m in (32, 64)],
+    "sq8": [({}, None, [None])],
+    "pq": [({"pq_m": m}, None, [None]) for m in (32, 64, 128)],
+    "flat16": [({}, None, [None])],
+}
+COMPRIMIDOS = {"sq8", "pq", "ivfpq", "flat16"}
+
+
+def carregar_vetores() -> np.ndarray:
+    npy = VET_DIR / "articles_embeddings.npy"
+    if npy.exists():
+        vetores = np.load(npy).astype("float32")
+        # Linhas zeradas são ids vagos (registros removidos)
+        return vetores[np.any(vetores != 0, axis=1)]
+    index = faiss.read_index(str(VET_DIR / "articles_faiss.index"))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def consultas_sinteticas(vetores: np.ndarray, n: int, ruido: float = 0.05, seed: int = 0) -> np.ndarray:
+    """Sem perguntas reais, usa vetores da base perturbados por ruído gaussiano."""
+    rng = np.random.default_rng(seed)
+    escolhidos = vetores[rng.choice(len(vetores), size=min(n, len(vetores)), replace=False)]
+    escala = ruido * np.linalg.norm(escolhidos, axis=1, keepdims=True) / np.sqrt(vetores.shape[1])
+    return (escolhidos + rng.standard_normal(escolhidos.shape) * escala).astype("float32")
+
+
+def memoria_mb(index) -> float:
+    return faiss.serialize_index(index).size / 2**20
+
+
+def medir(index, consultas, gabarito, k, params, vetores=None, rerank=0):
+    latencias = []
+    acertos = 0
+    for q, verdade in zip(consultas, gabarito):
+        inicio = time.perf_counter()
+        if rerank > 1:
+            _, candidatos = index.search(q.reshape(1, -1), k * rerank, params=params)
+            _, I = reordenar_exato(q.reshape(1, -1), candidatos, vetores, k)
+        else:
+            _, I = index.search(q.reshape(1, -1), k, params=params)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        acertos += len(set(I[0]) & set(verdade))
+    recall = acertos / (len(consultas) * k)
+    return recall, np.percentile(latencias, 50), np.percentile(latencias, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k e latência por tipo de índice FAISS.")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--queries", help="arquivo .npy com embeddings de perguntas")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--tipos", nargs="+", default=list(GRADE))
+    parser.add_argument("--rerank", type=int, default=0,
+                        help="nos tipos comprimidos, reordena N*k candidatos com os vetores exatos")
+    args = parser.parse_args()
+
+    vetores = carregar_vetores()
+    consultas = (np.load(args.queries).astype("float32") if args.queries
+                 else consultas_sinteticas(vetores, args.n_queries))
+    print(f"Base: {vetores.shape[0]} vetores de dim {vetores.shape[1]}, {len(consultas)} consultas, k={args.k}\n")
+
+    exato = faiss.IndexFlatL2(vetores.shape[1])
+    exato.add(vetores)
+    _, gabarito = exato.search(consultas, args.k)
+
+    print(f"{'índice':<28}{'busca':<16}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'build s':>10}{'MB':>10}{'B/vetor':>10}")
+    for tipo in args.tipos:
+        for construcao, nome_param, valores in GRADE[tipo]:
+            inicio = time.perf_counter()
+            try:
+                index = construir_indice(vetores, tipo=tipo, **construcao)
+            except (RuntimeError, ValueError) as e:
+                print(f"{tipo:<28}ignorado: {e}")
+                continue
+            build = time.perf_counter() - inicio
+            mb = memoria_mb(index)
+            por_vetor = mb * 2**20 / index.ntotal
+            rotulo = tipo + "".join(f" {c}={v}" for c, v in construcao.items())
+            reranks = [0, args.rerank] if args.rerank > 1 and tipo in COMPRIMIDOS else [0]
+            for valor in valores:
+                params = parametros_busca(index, **{nome_param: valor}) if nome_param else None
+                for rerank in reranks:
+                    recall, p50, p99 = medir(index, consultas, gabarito, args.k, params, vetores, rerank)
+                    busca = f"{nome_param}={valor}" if nome_param else "-"
+                    if rerank:
+                        busca += f" rr{rerank}"
+                    print(f"{rotulo:<28}{busca:<16}{recall:>10.3f}{p50:>10.3f}{p99:>10.3f}"
+                          f"{build:>10.2f}{mb:>10.2f}{por_vetor:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
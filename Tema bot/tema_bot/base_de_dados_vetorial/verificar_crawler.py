@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verificação offline do crawler (scrape_and_vector_ingest.py).
+
+Sobe um help center de mentira num servidor HTTP local (porta livre), aponta
+o crawler para ele via SCRAPER_BASE_URL / SCRAPER_CATEGORY_URL e confere o
+articles_data.js gerado contra o resultado da varredura sequencial:
+artigos diretos da categoria primeiro, depois os das seções na ordem das
+seções, sem repetir URLs. Um dos artigos responde 503 na primeira requisição,
+para exercitar o retry. Em seguida roda a coleta incremental (--delta) pelo
+sitemap, que também lista um artigo de outra categoria: ele não pode entrar.
+Sobre a coleta anterior, uma rodada sem mudanças não pode ler nenhuma listagem;
+depois um artigo alterado e um id novo numa seção: só o id novo faz ler a listagem.
+Não grava nada na pasta da base (cache HTTP desligado, saída em pasta temporária).
+
+Uso:
+    python verificar_crawler.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+CATEGORIA = "/hc/pt-br/categories/100-geral"
+SECOES = {
+    "/hc/pt-br/sections/10-rh": ("RH", ["2", "1", "3"]),
+    "/hc/pt-br/sections/20-beneficios": ("Benefícios", ["3", "4"]),
+}
+ARTIGOS = {n: (f"Artigo {n}", [f"Parágrafo {n} a", f"Parágrafo {n} b"]) for n in "12349"}
+FORA_DA_CATEGORIA = "9"  # só aparece no sitemap
+INSTAVEL = "/hc/pt-br/articles/4"  # 503 na primeira vez
+NOVO = "5"  # entra na seção RH na última rodada
+
+
+def _lista(itens):
+    lis = "".join(
+        f'<li class="article-list-item"><a class="article-list-item__link" href="{href}">{titulo}</a></li>'
+        for titulo, href in itens
+    )
+    return f'<ul class="article-list">{lis}</ul>'
+
+
+def paginas() -> dict:
+    site = {
+        CATEGORIA: "<html>"
+        + _lista([("RH", "/hc/pt-br/sections/10-rh"), ("Artigo 1", "/hc/pt-br/articles/1")])
+        + _lista([("Benefícios", "/hc/pt-br/sections/20-beneficios")])
+        + "</html>",
+    }
+    for caminho, (_, artigos) in SECOES.items():
+        site[caminho] = _lista([(ARTIGOS[n][0], f"/hc/pt-br/articles/{n}") for n in artigos])
+    for n, (titulo, paragrafos) in ARTIGOS.items():
+        corpo = "".join(f"<p>{p}</p>" for p in paragrafos)
+        site[f"/hc/pt-br/articles/{n}"] = f'<h1>{titulo}</h1><div class="article-body">{corpo}</div>'
+    return site
+
+
+def sitemap(base_url: str, lastmods: dict) -> str:
+    urls = "".join(
+        f"<url><loc>{base_url}/hc/pt-br/articles/{n}</loc><lastmod>{lastmod}</lastmod></url>"
+        for n, lastmod in lastmods.items()
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+
+
+def esperado(base_url: str) -> list:
+    def artigo(n, **origem):
+        titulo, paragrafos = ARTIGOS[n]
+        return {"title": titulo, "url": f"{base_url}/hc/pt-br/articles/{n}",
+                "content": "\n\n".join(paragrafos), "category": "100", **origem}
+
+    saida, vistos = [artigo("1")], {"1"}
+    for caminho, (titulo, artigos) in SECOES.items():
+        secao = caminho.rsplit("/", 1)[1].split("-")[0]
+        for n in artigos:
+            if n not in vistos:
+                vistos.add(n)
+                saida.append(artigo(n, section=secao, section_title=titulo))
+    return saida
+
+
+def servidor(site: dict, acessos: list) -> ThreadingHTTPServer:
+    falhou = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            acessos.append(self.path)
+            if self.path == INSTAVEL and self.path not in falhou:
+                falhou.add(self.path)
+                self.send_response(503)
+                self.end_headers()
+                return
+            corpo = site.get(self.path)
+            self.send_response(200 if corpo else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.end_headers()
+            if corpo:
+                self.wfile.write(corpo.encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def main() -> int:
+    site, acessos = paginas(), []
+    httpd = servidor(site, acessos)
+    base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    lastmods = {n: f"2026-01-0{i + 1}T00:00:00Z" for i, n in enumerate(ARTIGOS)}
+    site["/hc/sitemap.xml"] = sitemap(base_url, lastmods)
+    listagens = lambda: [p for p in acessos if "/sections/" in p or "/categories/" in p]
+    inicial = esperado(base_url)
+    os.environ.update(
+        SCRAPER_BASE_URL=base_url,
+        SCRAPER_CATEGORY_URL=base_url + CATEGORIA,
+        SCRAPER_CACHE="0",
+        SCRAPER_RATE="1000",
+        SCRAPER_BURST="100",
+    )
+    import scrape_and_vector_ingest as crawler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        destino = Path(tmp) / "articles_data.js"
+        crawler.main(dest=destino)
+        gerado = crawler.load_js(destino)
+
+        crawler.VET_DIR = Path(tmp)  # watermark na pasta temporária
+        destino_delta = Path(tmp) / "articles_delta.js"
+        crawler.main_delta(dest=destino_delta)
+        delta = crawler.load_js(destino_delta)
+
+        # sem mudanças desde a última marca: só o sitemap é lido
+        del acessos[:]
+        crawler.main_delta(dest=destino_delta)
+        sem_mudancas = listagens()
+        repetido = crawler.load_js(destino_delta)
+
+        # artigo 2 alterado e artigo novo na seção RH
+        ARTIGOS["2"] = ("Artigo 2", ["Parágrafo 2 revisto"])
+        ARTIGOS[NOVO] = (f"Artigo {NOVO}", [f"Parágrafo {NOVO} a"])
+        SECOES["/hc/pt-br/sections/10-rh"][1].append(NOVO)
+        site.update(paginas())
+        lastmods.update({"2": "2026-02-01T00:00:00Z", NOVO: "2026-02-01T00:00:00Z"})
+        site["/hc/sitemap.xml"] = sitemap(base_url, lastmods)
+        del acessos[:]
+        crawler.main_delta(dest=destino_delta)
+        com_novo = crawler.load_js(destino_delta)
+        lidos = set(acessos)
+    httpd.shutdown()
+
+    falhas = 0
+    if gerado != inicial:
+        print("❌ articles_data.js difere da varredura sequencial:")
+        print(json.dumps(gerado, ensure_ascii=False, indent=2))
+        falhas += 1
+    ordem = lambda artigos: sorted(artigos, key=lambda a: a["url"])
+    if ordem(delta) != ordem(inicial):
+        print("❌ coleta incremental pelo sitemap difere da categoria:")
+        print(json.dumps(delta, ensure_ascii=False, indent=2))
+        falhas += 1
+    if sem_mudancas or repetido != delta:
+        print(f"❌ delta sem mudanças leu listagens {sem_mudancas} ou alterou a base")
+        falhas += 1
+    if ordem(com_novo) != ordem(esperado(base_url)):
+        print("❌ delta com artigo alterado/novo difere da categoria:")
+        print(json.dumps(com_novo, ensure_ascii=False, indent=2))
+        falhas += 1
+    artigos_lidos = {p for p in lidos if "/articles/" in p}
+    if artigos_lidos != {"/hc/pt-br/articles/2", f"/hc/pt-br/articles/{NOVO}"}:
+        print(f"❌ delta com artigo alterado/novo raspou {sorted(artigos_lidos)}")
+        falhas += 1
+    if falhas:
+        return 1
+    print(f"✅ crawler OK ({len(gerado)} artigos, ordem e conteúdo iguais à varredura sequencial; "
+          f"delta pelo sitemap restrito à categoria, listagem só para ids novos)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())